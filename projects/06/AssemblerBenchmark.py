@@ -0,0 +1,212 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import gc
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak RSS is not reported there
+    resource = None
+
+import Main
+from Parser import Parser
+
+DEFAULT_LINE_COUNT = 1000000
+
+# Jumps are rare in real programs, most C commands only compute
+JUMP_RATIO = 0.1
+# Comments and empty lines, which the cleaning phase drops
+COMMENT_LINES = ["// a comment", ""]
+
+def generate_program(line_count, label_ratio=0.05, variable_count=100,
+                     symbol_ratio=0.5, c_ratio=0.6, comment_ratio=0.05,
+                     seed=0):
+    """Generates a random (but valid) Hack program.
+
+    Args:
+        line_count (int): the amount of lines of the program.
+        label_ratio (float): the fraction of lines which are labels.
+        variable_count (int): the amount of distinct variables.
+        symbol_ratio (float): the fraction of A commands which load a
+            symbol (a label or a variable) rather than a number.
+        c_ratio (float): the fraction of commands which are C commands.
+        comment_ratio (float): the fraction of lines which are comments or
+            empty.
+        seed (int): the seed of the generator, the same arguments always
+            generate the same program.
+
+    Returns:
+        List[str]: the lines of the program.
+    """
+    rng = random.Random(seed)
+    variables = [f"var_{index}" for index in range(variable_count)]
+    comps = list(Parser.COMP_OPCODES)
+    dests = [dest for dest in Parser.DEST_OPCODES if Parser.OPT_OPCODE != dest]
+    jmps = [jmp for jmp in Parser.JMP_OPCODES if Parser.OPT_OPCODE != jmp]
+
+    lines = []
+    # Symbols are only chosen once all the labels are placed, so labels may
+    # be referenced before they are defined
+    symbol_indices = []
+    labels = []
+    label_count = 0
+    rom_address = 0
+    for _ in range(line_count):
+        kind = rng.random()
+        if kind < comment_ratio:
+            lines.append(rng.choice(COMMENT_LINES))
+            continue
+        if kind < comment_ratio + label_ratio:
+            label = f"LABEL_{label_count}"
+            label_count += 1
+            # Labels beyond the ROM are defined, but cannot be referenced
+            if rom_address <= Parser.MAX_ADDRESS:
+                labels.append(label)
+            lines.append(f"({label})")
+            continue
+
+        rom_address += 1
+        if rng.random() < c_ratio:
+            command = rng.choice(comps)
+            if rng.random() < JUMP_RATIO:
+                command += ";" + rng.choice(jmps)
+                if rng.random() < 0.5:
+                    command = rng.choice(dests) + "=" + command
+            else:
+                command = rng.choice(dests) + "=" + command
+            lines.append(command)
+        elif rng.random() < symbol_ratio:
+            symbol_indices.append(len(lines))
+            lines.append(None)
+        else:
+            lines.append(f"@{rng.randrange(Parser.MAX_ADDRESS + 1)}")
+
+    for index in symbol_indices:
+        if labels and (not variables or rng.random() < 0.5):
+            lines[index] = "@" + rng.choice(labels)
+        elif variables:
+            lines[index] = "@" + rng.choice(variables)
+        else:
+            lines[index] = f"@{rng.randrange(Parser.MAX_ADDRESS + 1)}"
+    return lines
+
+def measure(phase, timings, function, *args):
+    """
+    Runs a single phase of the assembler, recording its duration
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = function(*args)
+    timings[phase] = time.perf_counter() - start
+    return result
+
+def write_text(words, output_path):
+    """
+    Writes the encoded words in the text format, as the assembler does
+    """
+    with open(output_path, 'w') as output_file:
+        for word in words:
+            output_file.write(Parser.to_text(word) + "\n")
+
+def benchmark_phases(lines, output_path):
+    """Times each phase of the default engine separately.
+
+    Returns:
+        Dict[str, float]: the duration of each phase, in seconds.
+    """
+    timings = {}
+    tokens = measure("clean", timings, list, Parser._lex_code(lines))
+    measure("label pass", timings, Parser._resolve_labels, tokens)
+    asm_parser = Parser(io.StringIO("\n".join(lines)))
+    words = measure("encode", timings, list, asm_parser.iterate_commands())
+    measure("write", timings, write_text, words, output_path)
+    return timings
+
+def benchmark_engines(input_path, output_path):
+    """Times a whole assembly of a file, by each of the engines.
+
+    Returns:
+        Dict[str, float]: the duration of each engine, in seconds.
+    """
+    timings = {}
+    for engine, options in [("default", {}),
+                            ("streaming", {"streaming": True}),
+                            ("single pass", {"single_pass": True})]:
+        def assemble():
+            with open(input_path, 'r') as input_file, \
+                    open(output_path, 'w') as output_file:
+                Main.assemble_file(input_file, output_file, **options)
+        measure(engine, timings, assemble)
+    return timings
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the process in MiB, None if it
+    cannot be measured on this platform
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, and in KiB elsewhere
+    return max_rss / (1024 * 1024 if "darwin" == sys.platform else 1024)
+
+def report(title, timings, line_count):
+    """
+    Prints the duration and the throughput of each of the timings
+    """
+    print(title)
+    for name, elapsed in timings.items():
+        print(f"  {name:12s} {elapsed:8.3f}s "
+              f"({line_count / elapsed:14,.0f} lines/sec)")
+
+def main():
+    """
+    Benchmarks the phases and the engines on a synthetic program
+    """
+    arg_parser = argparse.ArgumentParser(prog="AssemblerBenchmark")
+    arg_parser.add_argument("--lines", type=int, default=DEFAULT_LINE_COUNT,
+                            help="amount of lines of the synthetic program")
+    arg_parser.add_argument("--label-ratio", type=float, default=0.05,
+                            help="fraction of lines which are labels")
+    arg_parser.add_argument("--variables", type=int, default=100,
+                            help="amount of distinct variables")
+    arg_parser.add_argument("--symbol-ratio", type=float, default=0.5,
+                            help="fraction of A commands loading a symbol")
+    arg_parser.add_argument("--c-ratio", type=float, default=0.6,
+                            help="fraction of commands which are C commands")
+    arg_parser.add_argument("--comment-ratio", type=float, default=0.05,
+                            help="fraction of lines which are comments")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    lines = generate_program(args.lines, args.label_ratio, args.variables,
+                             args.symbol_ratio, args.c_ratio,
+                             args.comment_ratio, args.seed)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, "Benchmark.asm")
+        output_path = os.path.join(temp_dir, "Benchmark.hack")
+        with open(input_path, 'w') as input_file:
+            input_file.write("\n".join(lines) + "\n")
+
+        report("phases (default engine):",
+               benchmark_phases(lines, output_path), len(lines))
+        report("end to end:",
+               benchmark_engines(input_path, output_path), len(lines))
+
+    rss = peak_rss()
+    print(f"peak RSS: {'n/a' if rss is None else f'{rss:.1f} MiB'}")
+
+if "__main__" == __name__:
+    main()
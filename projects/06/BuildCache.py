@@ -0,0 +1,57 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import functools
+import os
+import shutil
+from ContentCache import ContentCache
+
+class BuildCache(ContentCache):
+    """A cache of assembled files, keyed by a hash of the assembly code, the
+    output options and the assembler itself, see ContentCache.
+    """
+
+    ENTRY_EXTENSION = ".hack"
+    SOURCE_MODULES = ("Main.py", "Parser.py", "SinglePassParser.py",
+                      "SymbolTable.py", "PeepholeOptimizer.py",
+                      "DeadCodeEliminator.py", "Preprocessor.py")
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """Places the cached file of the given key at the output path.
+
+        Args:
+            key (str): the cache key, see 'key'.
+            output_path (str): where the cached file should be placed.
+
+        Returns:
+            bool: True if the key was cached, False otherwise.
+        """
+        entry_path = self._use_entry(key)
+        if entry_path is None:
+            return False
+        try:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            try:
+                os.link(entry_path, output_path)
+            except OSError:
+                # Hardlinks are not supported (e.g. across file systems)
+                shutil.copyfile(entry_path, output_path)
+        except FileNotFoundError:
+            # Evicted by a concurrent build
+            return False
+        return True
+
+    def store(self, key: str, output_path: str) -> None:
+        """Caches the given output file under the given key (the cache is
+        only bounded by 'evict').
+
+        Args:
+            key (str): the cache key, see 'key'.
+            output_path (str): the assembled file to cache.
+        """
+        self._add_entry(key, functools.partial(shutil.copyfile, output_path))
@@ -0,0 +1,67 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import tempfile
+import unittest
+
+import Main
+from BuildCache import BuildCache
+
+class BuildCacheTest(unittest.TestCase):
+    """Tests the assembly of files through the BuildCache."""
+
+    def setUp(self) -> None:
+        """Creates a program and a cache in a temporary directory."""
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._cache_dir = os.path.join(self._temp_dir.name, "cache")
+        self._cache = BuildCache(self._cache_dir)
+        self._input_path = os.path.join(self._temp_dir.name, "Prog.asm")
+        with open(self._input_path, 'w') as input_file:
+            input_file.write("@R1\nM=1\n")
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        self._temp_dir.cleanup()
+
+    def _read_output(self) -> str:
+        """
+        Returns the assembled program
+        """
+        with open(os.path.join(self._temp_dir.name, "Prog.hack"), 'r') \
+                as output_file:
+            return output_file.read()
+
+    def test_cold_and_warm(self) -> None:
+        """A file is assembled once, then served from the cache."""
+        self.assertIsNotNone(
+            Main.assemble_path(self._input_path, cache=self._cache))
+        cold_output = self._read_output()
+        self.assertIsNone(
+            Main.assemble_path(self._input_path, cache=self._cache))
+        self.assertEqual(self._read_output(), cold_output)
+
+    def test_options_are_keyed(self) -> None:
+        """Assembling into another format is not served from the cache."""
+        Main.assemble_path(self._input_path, cache=self._cache)
+        self.assertIsNotNone(Main.assemble_path(
+            self._input_path, Main.BINARY_FORMAT, cache=self._cache))
+
+    def test_evict(self) -> None:
+        """The least recently used entries are evicted first."""
+        # Only a single entry fits
+        cache = BuildCache(self._cache_dir,
+                           max_size=os.path.getsize(self._input_path))
+        for key in ["old", "new"]:
+            cache.store(key, self._input_path)
+            os.utime(os.path.join(self._cache_dir, key + ".hack"),
+                     (0, {"old": 1, "new": 2}[key]))
+        cache.evict()
+        self.assertEqual(os.listdir(self._cache_dir), ["new.hack"])
+
+if "__main__" == __name__:
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+from typing import List, Optional, Set, Tuple
+from Parser import Parser, Token
+from SymbolTable import SymbolKinds, SymbolTable
+
+class DeadCodeEliminator:
+    """Removes the code which can never be executed, and the labels which
+    are never referenced, from an assembled program before it is encoded.
+    The program is split into basic blocks, starting at labels and ending
+    at jumps. A block is reachable if it is the first one, if a reachable
+    block falls through into it, or if a reachable block loads its label
+    into A (either to jump to it, or to store it as a return address for
+    an indirect jump later).
+    Hence, jumps must target labels: programs which may jump to numeric
+    ROM addresses (e.g. the book's Pong.asm, see Parser.has_numeric_jumps)
+    are left as they are, as these addresses would change.
+    """
+
+    # The jump which never falls through into the next block
+    UNCONDITIONAL_JUMP = "JMP"
+
+    def __init__(self) -> None:
+        """Creates a new eliminator, which counts what it removed."""
+        self._removed_commands = 0
+        self._removed_blocks = 0
+        self._removed_labels = 0
+        self._skipped = False
+
+    def optimize(self, code: List[Token], symbol_table: SymbolTable,
+                 source_lines: Optional[array.array] = None
+                 ) -> Tuple[List[Token], Optional[array.array]]:
+        """Removes the unreachable blocks of the given code (which has no
+        labels), and the unused labels of the symbol table.
+
+        Args:
+            code (List[Token]): the lexed commands of the program.
+            symbol_table (SymbolTable): the symbol table of the program.
+            source_lines (Optional[array.array]): the source line of each
+                command, if tracked.
+
+        Returns:
+            Tuple[List[Token], Optional[array.array]]: the remaining code,
+            and the source line of each of its commands, if tracked.
+        """
+        if Parser.has_numeric_jumps(code):
+            self._skipped = True
+            return code, source_lines
+
+        labels = symbol_table.sorted_symbols(SymbolKinds.LABEL)
+        blocks = DeadCodeEliminator._split_blocks(code, labels)
+        reachable = DeadCodeEliminator._find_reachable_blocks(
+            code, blocks, symbol_table)
+
+        # Keeping the reachable blocks, while recording the new address of
+        # the start of every block (and of the end of the program)
+        relocations = {}
+        remaining_code = []
+        remaining_lines = array.array("l") if source_lines is not None else None
+        referenced_labels = set()
+        for index, (start, end) in enumerate(blocks):
+            relocations[start] = len(remaining_code)
+            if index not in reachable:
+                self._removed_commands += end - start
+                self._removed_blocks += 1
+                continue
+            remaining_code += code[start:end]
+            if remaining_lines is not None:
+                remaining_lines += source_lines[start:end]
+            referenced_labels.update(
+                token[1] for token in code[start:end]
+                if Parser.A_TOKEN == token[0])
+        relocations[len(code)] = len(remaining_code)
+
+        for _, label in labels:
+            if label not in referenced_labels:
+                symbol_table.remove_entry(label)
+                self._removed_labels += 1
+        symbol_table.relocate_labels(relocations)
+        return remaining_code, remaining_lines
+
+    def get_total_saved_commands(self) -> int:
+        """Returns the amount of commands removed."""
+        return self._removed_commands
+
+    def __repr__(self) -> str:
+        if self._skipped:
+            return "DeadCodeEliminator(skipped, jumps to numeric addresses)"
+        return (f"DeadCodeEliminator(saved {self._removed_commands} commands "
+                f"in {self._removed_blocks} blocks, "
+                f"removed {self._removed_labels} unused labels)")
+
+    @staticmethod
+    def _split_blocks(code: List[Token],
+                      labels: List[Tuple[int, str]]) -> List[Tuple[int, int]]:
+        """
+        Returns the (start, end) addresses of the basic blocks of the code,
+        each starts at the program start, at a label or after a jump
+        """
+        leaders = {0, len(code)}
+        leaders.update(address for address, _ in labels)
+        leaders.update(index + 1 for index, token in enumerate(code)
+                       if Parser.C_TOKEN == token[0] and
+                       Parser.OPT_OPCODE != token[3])
+        leaders = sorted(leader for leader in leaders if leader <= len(code))
+        return list(zip(leaders, leaders[1:]))
+
+    @staticmethod
+    def _find_reachable_blocks(code: List[Token],
+                               blocks: List[Tuple[int, int]],
+                               symbol_table: SymbolTable) -> Set[int]:
+        """
+        Returns the indices of the blocks reachable from the first block
+        """
+        block_by_start = {start: index for index, (start, _) in enumerate(blocks)}
+        reachable = set()
+        pending = [0] if blocks else []
+        while pending:
+            index = pending.pop()
+            if index in reachable:
+                continue
+            reachable.add(index)
+            start, end = blocks[index]
+
+            for token in code[start:end]:
+                if (Parser.A_TOKEN == token[0] and
+                        symbol_table.contains(token[1]) and
+                        SymbolKinds.LABEL == symbol_table.get_kind(token[1])):
+                    # Labels at the end of the program start no block
+                    target = block_by_start.get(
+                        symbol_table.get_address(token[1]))
+                    if target is not None:
+                        pending.append(target)
+
+            last = code[end - 1]
+            falls_through = not (Parser.C_TOKEN == last[0] and
+                                 DeadCodeEliminator.UNCONDITIONAL_JUMP == last[3])
+            if falls_through and index + 1 < len(blocks):
+                pending.append(index + 1)
+        return reachable
@@ -0,0 +1,39 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import unittest
+
+from Main import assemble
+from DeadCodeEliminator import DeadCodeEliminator
+
+class DeadCodeEliminatorTest(unittest.TestCase):
+    """Tests the blocks removed by the DeadCodeEliminator."""
+
+    def test_unreachable_block(self) -> None:
+        """A block which nothing jumps to nor falls into is removed."""
+        source = "\n".join([
+            "(END)", "@END", "0;JMP",
+            "@R1", "M=1"])
+        words, _ = assemble(source, optimizers=[DeadCodeEliminator()])
+        self.assertEqual(words.tolist(),
+                         assemble("(END)\n@END\n0;JMP\n")[0].tolist())
+
+    def test_numeric_return_address(self) -> None:
+        """BACK is only reached through a return address loaded as a number
+        (6), so nothing is removed.
+        """
+        source = "\n".join([
+            "@6", "D=A", "@R0", "M=D", "@SUB", "0;JMP",
+            "(BACK)", "@R1", "M=1",
+            "(END)", "@END", "0;JMP",
+            "(SUB)", "@R0", "A=M", "0;JMP"])
+        words, _ = assemble(source, optimizers=[DeadCodeEliminator()])
+        self.assertEqual(words.tolist(), assemble(source)[0].tolist())
+        self.assertEqual(13, len(words))
+
+if "__main__" == __name__:
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import array
+import sys
+import typing
+from Parser import Parser
+from SymbolMap import SymbolMap
+
+def inverse_table(opcodes: typing.Dict[str, str],
+                  size: int) -> typing.List[typing.Optional[str]]:
+    """Inverts an opcode table of the Parser into a lookup array.
+
+    Args:
+        opcodes (typing.Dict[str, str]): mapping mnemonics to binary opcodes.
+        size (int): the amount of possible opcodes.
+
+    Returns:
+        typing.List[typing.Optional[str]]: the mnemonic of each opcode, None
+            for invalid opcodes.
+    """
+    table = [None] * size
+    for mnemonic, opcode in opcodes.items():
+        table[int(opcode, 2)] = mnemonic
+    return table
+
+class Disassembler:
+    """Translates Hack machine code back into assembly, using arrays which
+    invert the opcode tables of the Parser, indexed by the fields of the
+    instruction.
+    """
+
+    # The comp field is 9 bits wide (rather than the 7 bits of the book),
+    # as it carries the 2 bits following the MSB, which tell the extended
+    # shift instructions (101...) from the regular C commands (111...)
+    COMP_SHIFT = 6
+    COMP_MASK = (1 << 9) - 1
+    DEST_SHIFT = 3
+    DEST_MASK = (1 << 3) - 1
+    JMP_MASK = (1 << 3) - 1
+
+    COMP_MNEMONICS = inverse_table(Parser.COMP_OPCODES, COMP_MASK + 1)
+    DEST_MNEMONICS = inverse_table(Parser.DEST_OPCODES, DEST_MASK + 1)
+    JMP_MNEMONICS = inverse_table(Parser.JMP_OPCODES, JMP_MASK + 1)
+
+    A_COMMAND_MASK = 1 << (Parser.WORD_LEN - 1)
+
+    @staticmethod
+    def disassemble_word(word: int) -> str:
+        """Disassembles a single instruction.
+
+        Args:
+            word (int): a 16-bit instruction.
+
+        Returns:
+            str: the assembly command of the instruction.
+
+        Raises:
+            ValueError: if the instruction is invalid.
+        """
+        if not word & Disassembler.A_COMMAND_MASK:
+            return f"{Parser.A_COMMAND_PREFIX}{word}"
+
+        comp = Disassembler.COMP_MNEMONICS[
+            (word >> Disassembler.COMP_SHIFT) & Disassembler.COMP_MASK]
+        if comp is None:
+            raise ValueError(
+                f"Disassembler: Invalid instruction {word:{Parser.TEXT_FORMAT}}")
+        dest = Disassembler.DEST_MNEMONICS[
+            (word >> Disassembler.DEST_SHIFT) & Disassembler.DEST_MASK]
+        jmp = Disassembler.JMP_MNEMONICS[word & Disassembler.JMP_MASK]
+
+        command = comp
+        if Parser.OPT_OPCODE != dest:
+            command = f"{dest}={command}"
+        if Parser.OPT_OPCODE != jmp:
+            command = f"{command};{jmp}"
+        return command
+
+    @staticmethod
+    def disassemble(words: typing.Iterable[int],
+                    symbol_map: typing.Optional[SymbolMap] = None
+                    ) -> typing.Iterator[str]:
+        """Disassembles a whole program.
+
+        Args:
+            words (typing.Iterable[int]): the instructions of the program.
+            symbol_map (typing.Optional[SymbolMap]): if given, the labels of
+                the program are placed back before their instructions.
+
+        Yields:
+            str: the lines of the program.
+        """
+        labels = symbol_map.labels_by_address() if symbol_map else {}
+        # Programs repeat the same few instructions over and over, so every
+        # instruction is decoded only once
+        known_commands = {}
+        for address, word in enumerate(words):
+            for label in labels.pop(address, []):
+                yield f"({label})"
+            command = known_commands.get(word)
+            if command is None:
+                command = Disassembler.disassemble_word(word)
+                known_commands[word] = command
+            yield command
+
+        # Labels may also point right past the last instruction
+        for address in sorted(labels):
+            for label in labels[address]:
+                yield f"({label})"
+
+    @staticmethod
+    def read_text(input_file: typing.TextIO) -> array.array:
+        """Reads a program in the textual .hack format.
+
+        Args:
+            input_file (typing.TextIO): the .hack file.
+
+        Returns:
+            array.array: the instructions of the program.
+        """
+        return array.array("H", (int(line, 2) for line in input_file
+                                 if line.strip()))
+
+    @staticmethod
+    def read_binary(input_file: typing.BinaryIO,
+                    byteorder: str = "big") -> array.array:
+        """Reads a packed ROM image.
+
+        Args:
+            input_file (typing.BinaryIO): the ROM image.
+            byteorder (str): the byte order of each word, "big" or "little".
+
+        Returns:
+            array.array: the instructions of the program.
+        """
+        words = array.array("H")
+        words.frombytes(input_file.read())
+        if byteorder != sys.byteorder:
+            words.byteswap()
+        return words
+
+if "__main__" == __name__:
+    arg_parser = argparse.ArgumentParser(prog="Disassembler")
+    arg_parser.add_argument("input_path", help="a .hack file to disassemble")
+    arg_parser.add_argument("--format", choices=["text", "binary"],
+                            default="text",
+                            help="format of the input .hack file")
+    arg_parser.add_argument("--byteorder", choices=["big", "little"],
+                            default="big",
+                            help="byte order of the binary format words")
+    arg_parser.add_argument("--symbol-map",
+                            help="a symbol map written by the assembler, "
+                                 "its labels are placed back in the output")
+    arg_parser.add_argument("--output",
+                            help="writes the assembly to this file, instead "
+                                 "of to stdout")
+    args = arg_parser.parse_args()
+
+    if "binary" == args.format:
+        with open(args.input_path, 'rb') as input_file:
+            program = Disassembler.read_binary(input_file, args.byteorder)
+    else:
+        with open(args.input_path, 'r') as input_file:
+            program = Disassembler.read_text(input_file)
+    program_symbols = None
+    if args.symbol_map is not None:
+        with open(args.symbol_map, 'r') as symbol_map_file:
+            program_symbols = SymbolMap.read(symbol_map_file)
+
+    output_file = sys.stdout
+    if args.output is not None:
+        output_file = open(args.output, 'w')
+    with output_file:
+        for line in Disassembler.disassemble(program, program_symbols):
+            output_file.write(line + "\n")
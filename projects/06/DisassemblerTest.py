@@ -0,0 +1,53 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import unittest
+
+from Disassembler import Disassembler
+from Main import assemble
+
+class DisassemblerTest(unittest.TestCase):
+    """Tests that disassembled programs assemble back into themselves."""
+
+    def _assert_round_trip(self, source: str) -> None:
+        """
+        Asserts that the program is the same after disassembling it and
+        assembling it back, with and without its labels
+        """
+        words, symbol_map = assemble(source)
+        for labels in [None, symbol_map]:
+            disassembled = "\n".join(Disassembler.disassemble(words, labels))
+            self.assertEqual(assemble(disassembled)[0].tolist(),
+                             words.tolist())
+
+    def test_bare_comp(self) -> None:
+        """A command with neither dest nor jmp (e.g. '0') reassembles."""
+        self.assertEqual(list(Disassembler.disassemble(assemble("D\n0\n")[0])),
+                         ["D", "0"])
+        self._assert_round_trip("D\n0\nM+1\n")
+
+    def test_every_C_command(self) -> None:
+        """Every comp, dest & jmp of the opcode tables round-trips."""
+        lines = []
+        for comp in Disassembler.COMP_MNEMONICS:
+            if comp is None:
+                continue
+            for dest in ["", "AMD="]:
+                lines.append(dest + comp)
+            lines.append(comp + ";JMP")
+        self._assert_round_trip("\n".join(lines))
+
+    def test_pong(self) -> None:
+        """A whole program round-trips, with its labels."""
+        pong_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "pong", "PongL.asm")
+        with open(pong_path, 'r') as pong_file:
+            self._assert_round_trip(pong_file.read())
+
+if "__main__" == __name__:
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from Parser import Parser
+
+# The output of the VM translator for a whole game, so the lines repeat (and
+# the memo of the lexer hits) as much as in real programs
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "pong", "Pong.asm")
+DEFAULT_REPEAT = 10
+
+# A mix of lines resembling the output of the VM translator, for a
+# synthetic corpus
+SAMPLE_LINES = [
+    "@SP",
+    "M=M-1",
+    "A=M",
+    "D=M",
+    "A=A-1",
+    "M=D+M",
+    "@LCL",
+    "AM=M+1",
+    "D;JNE",
+    "0;JMP",
+    "@256",
+    "(LOOP_START)",
+    "// push constant 7",
+    "    D=M    // inline comment",
+    "",
+]
+
+def generate_lines(line_count):
+    """
+    Generates the given amount of lines, drawn from SAMPLE_LINES
+    """
+    rng = random.Random(0)
+    return [rng.choice(SAMPLE_LINES) for _ in range(line_count)]
+
+def lex_slow(lines):
+    """
+    Lexes the lines one by one, as the lexer did before it was compiled
+    """
+    tokens = []
+    for line in lines:
+        token = Parser._lex_line(line)
+        if token is not None:
+            tokens.append(token)
+    return tokens
+
+def lex_compiled(lines):
+    """
+    Lexes the lines by the compiled lexer of the Parser, without its memo
+    """
+    return list(Parser._lex_code(lines, max_known_tokens=0))
+
+def lex_memoized(lines):
+    """
+    Lexes the lines by the compiled lexer of the Parser, as the assembler
+    does (remembering the tokens of repeated lines)
+    """
+    return list(Parser._lex_code(lines))
+
+def read_lines(input_paths):
+    """
+    Reads the lines of the given files, as the assembler iterates them
+    """
+    lines = []
+    for input_path in input_paths:
+        with open(input_path, 'r') as input_file:
+            lines += input_file.readlines()
+    return lines
+
+def benchmark(name, lexer, lines, repeat):
+    """
+    Times a single lexer on the given lines (lexing them from scratch each
+    time), returning its tokens
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        tokens = lexer(lines)
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {elapsed:.3f}s "
+          f"({len(lines) * repeat / elapsed:,.0f} lines/sec)")
+    return tokens
+
+def main():
+    """
+    Compares the throughput (and the output) of the lexers
+    """
+    arg_parser = argparse.ArgumentParser(prog="LexerBenchmark")
+    arg_parser.add_argument("input_paths", nargs="*", default=[DEFAULT_CORPUS],
+                            help="the .asm files lexed (by default, the "
+                                 "translated Pong game)")
+    arg_parser.add_argument("--synthetic", type=int, metavar="LINES",
+                            help="lexes this amount of lines drawn from "
+                                 "SAMPLE_LINES instead (which are few, so "
+                                 "the memo hits almost every line)")
+    arg_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                            help="amount of times the lines are lexed")
+    args = arg_parser.parse_args()
+
+    if args.synthetic is not None:
+        lines = generate_lines(args.synthetic)
+    else:
+        lines = read_lines(args.input_paths)
+    print(f"{len(lines):,} lines, {len(set(lines)):,} distinct")
+    all_tokens = [benchmark(name, lexer, lines, args.repeat)
+                  for name, lexer in [("clean & split", lex_slow),
+                                      ("compiled lexer", lex_compiled),
+                                      ("compiled lexer + memo", lex_memoized)]]
+    if any(tokens != all_tokens[0] for tokens in all_tokens):
+        sys.exit("The lexers disagree!")
+
+if "__main__" == __name__:
+    main()
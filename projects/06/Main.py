@@ -5,49 +5,472 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import array
+import concurrent.futures
+import contextlib
 import os
 import sys
 import typing
+from BuildCache import BuildCache
+from DeadCodeEliminator import DeadCodeEliminator
 from Parser import Parser
+from PeepholeOptimizer import PeepholeOptimizer
+from Preprocessor import Preprocessor
+from SinglePassParser import SinglePassParser
+from SymbolMap import SymbolMap
+from SymbolTable import SymbolTable
+
+# Output formats of the assembled program, the textual format is the one
+# defined by the book (a line of 16 '0'/'1' characters per instruction),
+# the binary format is a packed ROM image of 16-bit words
+TEXT_FORMAT = "text"
+BINARY_FORMAT = "binary"
+OUTPUT_FORMATS = [TEXT_FORMAT, BINARY_FORMAT]
+
+BYTE_ORDERS = ["big", "little"]
+
+# Reading the input from stdin and writing the output to stdout
+STDIO_PATH = "-"
+
+SYMBOL_MAP_EXTENSION = ".map.json"
+
+def create_parser(
+        input_file: typing.Union[typing.TextIO, typing.Iterable[str]],
+        streaming: bool = False, single_pass: bool = False,
+        track_lines: bool = False,
+        optimizers: typing.Sequence = ()
+        ) -> typing.Union[Parser, SinglePassParser]:
+    """Creates the requested assembly engine for a single file.
+
+    Args:
+        input_file (typing.Union[typing.TextIO, typing.Iterable[str]]): the
+            file to assemble, or its lines (unless streaming).
+        streaming (bool): if this is True, the input file is read twice
+            instead of being kept in memory.
+        single_pass (bool): if this is True, the input file is read only
+            once, and forward references are backpatched.
+        track_lines (bool): if this is True, the source line of each command
+            is recorded.
+        optimizers (typing.Sequence): passes applied in order on the code
+            before it is encoded (only by the default engine), e.g.
+            DeadCodeEliminator and PeepholeOptimizer.
+
+    Returns:
+        typing.Union[Parser, SinglePassParser]: the engine, its commands are
+            assembled by 'iterate_commands'.
+    """
+    if single_pass:
+        if optimizers:
+            raise ValueError("Main: Cannot optimize in single pass mode")
+        return SinglePassParser(input_file, track_lines)
+    return Parser(input_file, streaming, track_lines, optimizers)
+
+def write_symbol_map(
+        asm_parser: typing.Union[Parser, SinglePassParser],
+        symbol_map_file: typing.TextIO) -> None:
+    """Writes the symbol map of a program, after all of it was assembled.
+
+    Args:
+        asm_parser (typing.Union[Parser, SinglePassParser]): the engine
+            which assembled the program, tracking its source lines.
+        symbol_map_file (typing.TextIO): writes the map to this file.
+    """
+    SymbolMap.from_symbol_table(
+        asm_parser.get_symbol_table(),
+        asm_parser.get_source_lines()).write(symbol_map_file)
 
 def assemble_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.Union[typing.TextIO, typing.Iterable[str]],
+        output_file: typing.TextIO,
+        streaming: bool = False, single_pass: bool = False,
+        symbol_map_file: typing.Optional[typing.TextIO] = None,
+        optimizers: typing.Sequence = ()
+        ) -> SymbolTable:
     """Assembles a single file.
 
     Args:
-        input_file (typing.TextIO): the file to assemble.
+        input_file (typing.Union[typing.TextIO, typing.Iterable[str]]): the
+            file to assemble, or its lines (unless streaming).
         output_file (typing.TextIO): writes all output to this file.
+        streaming (bool): if this is True, the input file is read twice
+            instead of being kept in memory.
+        single_pass (bool): if this is True, the input file is read only
+            once, and forward references are backpatched.
+        symbol_map_file (typing.Optional[typing.TextIO]): if given, the
+            symbol map of the file is written to it, see SymbolMap.
+        optimizers (typing.Sequence): passes applied in order on the code
+            before it is encoded.
+
+    Returns:
+        SymbolTable: the symbol table of the assembled file.
     """
     # Your code goes here!
     # A good place to start is to initialize a new Parser object:
     # parser = Parser(input_file)
     # Note that you can write to output_file like so:
     # output_file.write("Hello world! \n")
-    asm_parser = Parser(input_file)
-    while asm_parser.has_more_commands():
-        cmd = asm_parser.get_next_command()
-        output_file.write(cmd + "\n")
+    asm_parser = create_parser(input_file, streaming, single_pass,
+                               symbol_map_file is not None, optimizers)
+    for cmd in asm_parser.iterate_commands():
+        output_file.write(Parser.to_text(cmd) + "\n")
+    if symbol_map_file is not None:
+        write_symbol_map(asm_parser, symbol_map_file)
+    return asm_parser.get_symbol_table()
+
+def assemble(
+        source: typing.Union[str, bytes, typing.Iterable[str]],
+        single_pass: bool = False, optimizers: typing.Sequence = ()
+        ) -> typing.Tuple[array.array, SymbolMap]:
+    """Assembles a program held in memory, without any file handles (e.g.
+    so the VM translator can assemble its output in-process).
+
+    Args:
+        source (typing.Union[str, bytes, typing.Iterable[str]]): the whole
+            program as a buffer, or its lines.
+        single_pass (bool): if this is True, the program is assembled by
+            the single pass engine (then the lines may be any iterable,
+            e.g. a generator, which is consumed once).
+        optimizers (typing.Sequence): passes applied in order on the code
+            before it is encoded (only by the default engine).
+
+    Returns:
+        typing.Tuple[array.array, SymbolMap]: the assembled program, one
+            word per instruction, and its symbol map.
+    """
+    if isinstance(source, bytes):
+        source = source.decode()
+    if isinstance(source, str):
+        source = source.splitlines()
+    asm_parser = create_parser(source, single_pass=single_pass,
+                               track_lines=True, optimizers=optimizers)
+    words = array.array("H", asm_parser.iterate_commands())
+    symbol_map = SymbolMap.from_symbol_table(
+        asm_parser.get_symbol_table(), asm_parser.get_source_lines())
+    return words, symbol_map
+
+def assemble_file_binary(
+        input_file: typing.Union[typing.TextIO, typing.Iterable[str]],
+        output_file: typing.BinaryIO,
+        byteorder: str = "big", streaming: bool = False,
+        single_pass: bool = False,
+        symbol_map_file: typing.Optional[typing.TextIO] = None,
+        optimizers: typing.Sequence = ()
+        ) -> SymbolTable:
+    """Assembles a single file into a packed ROM image.
+
+    Args:
+        input_file (typing.Union[typing.TextIO, typing.Iterable[str]]): the
+            file to assemble, or its lines (unless streaming).
+        output_file (typing.BinaryIO): writes the ROM image to this file.
+        byteorder (str): the byte order of each word, "big" or "little".
+        streaming (bool): if this is True, the input file is read twice
+            instead of being kept in memory.
+        single_pass (bool): if this is True, the input file is read only
+            once, and forward references are backpatched.
+        symbol_map_file (typing.Optional[typing.TextIO]): if given, the
+            symbol map of the file is written to it, see SymbolMap.
+        optimizers (typing.Sequence): passes applied in order on the code
+            before it is encoded.
+
+    Returns:
+        SymbolTable: the symbol table of the assembled file.
+    """
+    asm_parser = create_parser(input_file, streaming, single_pass,
+                               symbol_map_file is not None, optimizers)
+    write_rom_image(array.array("H", asm_parser.iterate_commands()),
+                    output_file, byteorder)
+    if symbol_map_file is not None:
+        write_symbol_map(asm_parser, symbol_map_file)
+    return asm_parser.get_symbol_table()
+
+def write_rom_image(
+        words: array.array, output_file: typing.BinaryIO,
+        byteorder: str = "big") -> None:
+    """Writes the given words as a packed ROM image, in a single write.
+
+    Args:
+        words (array.array): the assembled program.
+        output_file (typing.BinaryIO): writes the ROM image to this file.
+        byteorder (str): the byte order of each word, "big" or "little".
+    """
+    if byteorder not in BYTE_ORDERS:
+        raise ValueError(f"Main: Invalid byte order {byteorder}")
+
+    # The array is kept in the native byte order, so we only swap when
+    # the requested order differs (the array is swapped in-place, hence
+    # a copy is made first)
+    if byteorder != sys.byteorder:
+        words = array.array("H", words)
+        words.byteswap()
+    output_file.write(words.tobytes())
+
+def assemble_path(
+        input_path: str, output_format: str = TEXT_FORMAT,
+        byteorder: str = "big", streaming: bool = False,
+        single_pass: bool = False,
+        cache: typing.Optional[BuildCache] = None,
+        symbol_map: bool = False, optimize: bool = False,
+        eliminate_dead_code: bool = False, preprocess: bool = False,
+        include_dirs: typing.Sequence[str] = ()
+        ) -> typing.Optional[typing.Tuple[SymbolTable, typing.List]]:
+    """Assembles the .asm file at the given path into a .hack file next to it.
+
+    Args:
+        input_path (str): the path of the file to assemble.
+        output_format (str): the format of the output, as in OUTPUT_FORMATS.
+        byteorder (str): the byte order of each word of the binary format.
+        streaming (bool): if this is True, the input file is read twice
+            instead of being kept in memory.
+        single_pass (bool): if this is True, the input file is read only
+            once, and forward references are backpatched.
+        cache (typing.Optional[BuildCache]): if given, unchanged files are
+            served from this build cache (which is bounded by its owner,
+            see 'assemble_paths').
+        symbol_map (bool): if this is True, the symbol map of the file is
+            written next to it as well (the build cache is not used then).
+        optimize (bool): if this is True, the code is optimized by a
+            PeepholeOptimizer before it is encoded.
+        eliminate_dead_code (bool): if this is True, the unreachable code
+            and the unused labels are removed by a DeadCodeEliminator before
+            the code is encoded.
+        preprocess (bool): if this is True, the includes and macros of the
+            file are expanded by a Preprocessor before it is assembled (the
+            symbol map cannot be written then, as its lines would be those
+            of the expanded program).
+        include_dirs (typing.Sequence[str]): directories searched for
+            included files, when preprocessing.
+
+    Returns:
+        typing.Optional[typing.Tuple[SymbolTable, typing.List]]: the symbol
+            table of the assembled file and the optimization passes applied
+            on it, None if the file was served from the build cache.
+    """
+    filename, _ = os.path.splitext(input_path)
+    output_path = filename + ".hack"
+
+    # The preprocessed lines are assembled instead of the file itself
+    source_lines = None
+    if preprocess:
+        if symbol_map:
+            raise ValueError("Main: Cannot write the symbol map of a "
+                             "preprocessed file")
+        source_lines = Preprocessor(include_dirs).preprocess_file(input_path)
+
+    if symbol_map:
+        # The symbol map is not cached, hence the file is always assembled
+        cache = None
+    if cache is not None:
+        if source_lines is not None:
+            # Covering the content of the included files as well
+            code = "\n".join(source_lines).encode()
+        else:
+            with open(input_path, 'rb') as input_file:
+                code = input_file.read()
+        cache_key = BuildCache.key(
+            code, output_format, byteorder, str(optimize),
+            str(eliminate_dead_code))
+        if cache.fetch(cache_key, output_path):
+            return None
 
-if "__main__" == __name__:
-    # Parses the input path and calls assemble_file on each input file.
     # This opens both the input and the output files!
     # Both are closed automatically when the code finishes running.
-    # If the output file does not exist, it is created automatically in the
-    # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    # The output is written to a temporary file which then replaces the
+    # output file, so a previous output which is hardlinked to the build
+    # cache is never overwritten in-place
+    temp_output_path = output_path + ".tmp"
+    optimizers = []
+    if eliminate_dead_code:
+        optimizers.append(DeadCodeEliminator())
+    if optimize:
+        optimizers.append(PeepholeOptimizer())
+    try:
+        with contextlib.ExitStack() as stack:
+            input_file = source_lines
+            if input_file is None:
+                input_file = stack.enter_context(open(input_path, 'r'))
+            symbol_map_file = None
+            if symbol_map:
+                symbol_map_file = stack.enter_context(
+                    open(filename + SYMBOL_MAP_EXTENSION, 'w'))
+            if BINARY_FORMAT == output_format:
+                output_file = stack.enter_context(
+                    open(temp_output_path, 'wb'))
+                symbol_table = assemble_file_binary(
+                    input_file, output_file, byteorder, streaming,
+                    single_pass, symbol_map_file, optimizers)
+            else:
+                output_file = stack.enter_context(
+                    open(temp_output_path, 'w'))
+                symbol_table = assemble_file(
+                    input_file, output_file, streaming, single_pass,
+                    symbol_map_file, optimizers)
+    except BaseException:
+        # Not leaving a partial output behind (e.g. on a syntax error)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_output_path)
+        raise
+    os.replace(temp_output_path, output_path)
+
+    if cache is not None:
+        cache.store(cache_key, output_path)
+
+    return symbol_table, optimizers
+
+def assemble_paths(
+        input_paths: typing.List[str], jobs: int = 1,
+        cache_dir: typing.Optional[str] = None,
+        cache_size: int = BuildCache.DEFAULT_MAX_SIZE, **options
+        ) -> typing.List[typing.Tuple[str, typing.Optional[tuple],
+                                      typing.Optional[Exception]]]:
+    """Assembles each of the given files, see 'assemble_path'.
+    A failure of one file does not stop the assembly of the others.
+
+    Args:
+        input_paths (typing.List[str]): the paths of the files to assemble.
+        jobs (int): the amount of files assembled concurrently, each in
+            its own process.
+        cache_dir (typing.Optional[str]): if given, unchanged files are
+            served from the build cache at this directory.
+        cache_size (int): the maximal size of the build cache, in bytes.
+        options: passed as-is to 'assemble_path'.
+
+    Returns:
+        typing.List[typing.Tuple[str, typing.Optional[tuple],
+                                 typing.Optional[Exception]]]:
+            the path, the result of 'assemble_path' and the error (None on
+            success) of each file, in the order of the given paths.
+    """
+    cache = None
+    if cache_dir is not None:
+        cache = BuildCache(cache_dir, cache_size)
+        options["cache"] = cache
+
+    results = []
+    if 1 >= jobs:
+        for input_path in input_paths:
+            try:
+                results.append(
+                    (input_path, assemble_path(input_path, **options), None))
+            except Exception as error:
+                results.append((input_path, None, error))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            futures = [executor.submit(assemble_path, input_path, **options)
+                       for input_path in input_paths]
+            # Collecting the results by the order of submission, so the
+            # report does not depend on the order in which the processes
+            # finish
+            for input_path, future in zip(input_paths, futures):
+                try:
+                    results.append((input_path, future.result(), None))
+                except Exception as error:
+                    results.append((input_path, None, error))
+
+    if cache is not None:
+        # The cache is bounded once, after all the files were stored in it
+        cache.evict()
+    return results
+
+if "__main__" == __name__:
+    # Parses the input path and calls assemble_file on each input file.
+    arg_parser = argparse.ArgumentParser(prog="Assembler")
+    arg_parser.add_argument("input_path",
+                            help=f"a file or directory to assemble, or "
+                                 f"'{STDIO_PATH}' to assemble stdin to stdout")
+    arg_parser.add_argument("--format", choices=OUTPUT_FORMATS,
+                            default=TEXT_FORMAT,
+                            help="format of the output .hack file")
+    arg_parser.add_argument("--byteorder", choices=BYTE_ORDERS,
+                            default="big",
+                            help="byte order of the binary format words")
+    arg_parser.add_argument("--streaming", action="store_true",
+                            help="re-read the input instead of keeping it "
+                                 "in memory")
+    arg_parser.add_argument("--single-pass", action="store_true",
+                            help="read the input once, backpatching "
+                                 "forward references")
+    arg_parser.add_argument("--jobs", type=int, default=1,
+                            help="amount of files to assemble concurrently")
+    arg_parser.add_argument("--cache-dir",
+                            help="serve unchanged files from a build cache "
+                                 "at this directory")
+    arg_parser.add_argument("--cache-size", type=int,
+                            default=BuildCache.DEFAULT_MAX_SIZE // (1024 * 1024),
+                            help="maximal size of the build cache, in MiB")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="print the symbol counts and the RAM "
+                                 "high-water mark of each file")
+    arg_parser.add_argument("--symbol-map", action="store_true",
+                            help=f"write the labels, variables and source "
+                                 f"lines of each file to a "
+                                 f"{SYMBOL_MAP_EXTENSION} file")
+    arg_parser.add_argument("--optimize", action="store_true",
+                            help="apply peephole optimizations before "
+                                 "encoding, and print the commands saved")
+    arg_parser.add_argument("--eliminate-dead-code", action="store_true",
+                            help="remove unreachable code and unused labels "
+                                 "before encoding, and print the commands "
+                                 "saved")
+    arg_parser.add_argument("--preprocess", action="store_true",
+                            help="expand #include and #macro directives "
+                                 "before assembling")
+    arg_parser.add_argument("--include-dir", action="append", default=[],
+                            help="directory searched for included files "
+                                 "(may be given more than once)")
+    args = arg_parser.parse_args()
+    if ((args.optimize or args.eliminate_dead_code) and
+            (args.streaming or args.single_pass)):
+        arg_parser.error("--optimize and --eliminate-dead-code cannot be "
+                         "used with --streaming or --single-pass")
+    if args.preprocess and args.streaming:
+        arg_parser.error("--preprocess cannot be used with --streaming")
+    if args.preprocess and args.symbol_map:
+        # The lines of the map would be those of the expanded program
+        arg_parser.error("--preprocess cannot be used with --symbol-map")
+    if STDIO_PATH == args.input_path:
+        # Stdin cannot be re-read, hence only the single pass engine fits
+        if BINARY_FORMAT == args.format:
+            assemble_file_binary(sys.stdin, sys.stdout.buffer,
+                                 args.byteorder, single_pass=True)
+        else:
+            assemble_file(sys.stdin, sys.stdout, single_pass=True)
+        sys.exit(0)
+    argument_path = os.path.abspath(args.input_path)
     if os.path.isdir(argument_path):
         files_to_assemble = [
             os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
+            for filename in sorted(os.listdir(argument_path))]
     else:
         files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+    files_to_assemble = [
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == ".asm"]
+    results = assemble_paths(
+        files_to_assemble, args.jobs, output_format=args.format,
+        byteorder=args.byteorder, streaming=args.streaming,
+        single_pass=args.single_pass, cache_dir=args.cache_dir,
+        cache_size=args.cache_size * 1024 * 1024,
+        symbol_map=args.symbol_map, optimize=args.optimize,
+        eliminate_dead_code=args.eliminate_dead_code,
+        preprocess=args.preprocess, include_dirs=args.include_dir)
+    failures = [(input_path, error) for input_path, _, error in results
+                if error is not None]
+    if args.stats or args.optimize or args.eliminate_dead_code:
+        for input_path, result, error in results:
+            if error is not None:
+                continue
+            if result is None:
+                print(f"{input_path}: served from the build cache")
+                continue
+            symbol_table, optimizers = result
+            if args.stats:
+                print(f"{input_path}: {symbol_table}")
+            for optimizer in optimizers:
+                print(f"{input_path}: {optimizer}")
+    for input_path, error in failures:
+        print(f"{input_path}: {type(error).__name__}: {error}",
+              file=sys.stderr)
+    if failures:
+        sys.exit(f"Failed assembling {len(failures)} out of "
+                 f"{len(files_to_assemble)} files")
@@ -0,0 +1,28 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import tempfile
+import unittest
+
+import Main
+
+class MainTest(unittest.TestCase):
+    """Tests the assembly of files by their paths."""
+
+    def test_failure_leaves_no_output(self) -> None:
+        """A file which fails to assemble leaves no (temporary) output."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = os.path.join(temp_dir, "Bad.asm")
+            with open(input_path, 'w') as input_file:
+                input_file.write("@R1\nM=1\nD=Q\n")
+            results = Main.assemble_paths([input_path])
+            self.assertIsNotNone(results[0][2])
+            self.assertEqual(os.listdir(temp_dir), ["Bad.asm"])
+
+if "__main__" == __name__:
+    unittest.main()
@@ -5,9 +5,15 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
-from typing import List, Tuple, TextIO
+import array
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple, TextIO, Union
 import SymbolTable
 
+# A lexed line, one of:
+# (LABEL_TOKEN, label), (A_TOKEN, symbol), (C_TOKEN, dest, comp, jmp)
+Token = Tuple[str, ...]
+
 class Parser:
     """Encapsulates access to the input code. Reads an assembly program
     by reading each command line-by-line, parses the current command,
@@ -17,6 +23,7 @@ class Parser:
     COMMENT_NOTATION = "//"
     A_COMMAND_PREFIX = "@"
     WORD_LEN = 16
+    TEXT_FORMAT = f"0{WORD_LEN}b"
 
     COMP_COMMAND_PREFIX = "1"
 
@@ -75,16 +82,81 @@ class Parser:
                     "AD": "110",
                     "AMD": "111"}
 
-    def __init__(self, input_file: TextIO) -> None:
+    # Integer forms of the opcode tables above, already shifted into their
+    # position within the instruction word, so a C command is encoded by
+    # simply OR-ing its three fields together.
+    # The comp field also carries the C command prefix (the MSB)
+    COMP_CODES = {mnemonic: (1 << 15) | (int(opcode, 2) << 6)
+                  for mnemonic, opcode in COMP_OPCODES.items()}
+    DEST_CODES = {mnemonic: int(opcode, 2) << 3
+                  for mnemonic, opcode in DEST_OPCODES.items()}
+    JMP_CODES = {mnemonic: int(opcode, 2)
+                 for mnemonic, opcode in JMP_OPCODES.items()}
+
+    # A commands carry a 15-bit address, the MSB must remain 0
+    MAX_ADDRESS = (1 << (WORD_LEN - 1)) - 1
+
+    # The kinds of tokens produced by the lexer
+    LABEL_TOKEN = "L"
+    A_TOKEN = "A"
+    C_TOKEN = "C"
+
+    # Matches (and splits) a whole line of a well-formed program in a single
+    # pass: a label, an A command or a C command, each of which may be
+    # surrounded by whitespaces and followed by a comment. Lines with
+    # whitespaces inside the command itself (e.g. 'D = M') do not match,
+    # and are handled by the slower path of '_lex_line'
+    LINE_PATTERN = re.compile(
+        r"[ \t]*"
+        r"(?:\((?P<label>[^()\s/]*)\)"
+        r"|@(?P<symbol>[^\s/]+)"
+        r"|(?:(?P<dest>[^\s=;/]+)=)?(?P<comp>[^\s=;/]+)(?:;(?P<jmp>[^\s=;/]+))?)?"
+        r"[ \t]*(?://.*)?[\r\n]*")
+
+    # The maximal amount of distinct lines whose tokens the lexer remembers,
+    # so the memory of the streaming mode stays bounded (generated code has
+    # a unique label for every call site), the memo is restarted once full
+    MAX_KNOWN_TOKENS = 4096
+
+    def __init__(self, input_file: Union[TextIO, Iterable[str]],
+                 streaming: bool = False,
+                 track_lines: bool = False, optimizers=()) -> None:
         """Opens the input file and gets ready to parse it.
 
         Args:
-            input_file (typing.TextIO): input file.
+            input_file (typing.Union[typing.TextIO, typing.Iterable[str]]):
+                input file, or the lines of the program (only when not
+                streaming).
+            streaming (bool): if this is True, the code is not kept in memory.
+                The first pass only collects the labels, and the file is
+                re-read (hence must be seekable) while the commands are
+                parsed, so the memory is bounded by the symbol table.
+            track_lines (bool): if this is True, the source line of each
+                command is recorded, see 'get_source_lines'.
+            optimizers (Sequence): passes applied in order on the code
+                before it is encoded (e.g. PeepholeOptimizer). Cannot be
+                used in streaming mode.
         """
-        self._code, self._symbol_manager = \
-            Parser._prepare_code(input_file.read().splitlines())
+        if streaming and optimizers:
+            raise ValueError("Parser: Cannot optimize in streaming mode")
+        self._streaming = streaming
+        self._source_lines = array.array("l") if track_lines else None
+        if streaming:
+            self._symbol_manager = Parser._collect_labels(input_file)
+            input_file.seek(0)
+            self._code = Parser._iterate_commands(
+                input_file, self._source_lines)
+            self._pending_command = next(self._code, None)
+        else:
+            # Reading the whole file at once is faster than iterating it
+            if hasattr(input_file, "read"):
+                input_file = input_file.read().splitlines()
+            self._code, self._symbol_manager = Parser._prepare_code(
+                input_file, self._source_lines)
+            for optimizer in optimizers:
+                self._code, self._source_lines = optimizer.optimize(
+                    self._code, self._symbol_manager, self._source_lines)
         self._current_line_index = 0
-        self._next_available_address = 16
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
@@ -92,29 +164,56 @@ class Parser:
         Returns:
             bool: True if there are more commands, False otherwise.
         """
+        if self._streaming:
+            return self._pending_command is not None
         return not (len(self._code) == self._current_line_index)
 
-    def get_next_command(self) -> str:
+    def get_symbol_table(self) -> SymbolTable.SymbolTable:
+        """Returns the symbol table, which is complete only after all the
+        commands were parsed.
+        """
+        return self._symbol_manager
+
+    def get_source_lines(self) -> Optional[array.array]:
+        """Returns the (1-based) source line of each command, indexed by the
+        ROM address of the command, or None if lines are not tracked.
+        In the streaming mode, only the lines of the commands parsed so far
+        are available.
+        """
+        return self._source_lines
+
+    def iterate_commands(self) -> Iterator[int]:
+        """Yields all the remaining commands, see 'get_next_command'.
+        """
+        while self.has_more_commands():
+            yield self.get_next_command()
+
+    def get_next_command(self) -> int:
         """
         This function has to be called only if has_more_commands is True,
         otherwise index error will be thrown.
         This function replaces the original 'advance', 'command_type', 'symbol', 
         'dest' & 'comp' functions. And is more "blackbox" for the user.
+        The command is returned as a 16-bit integer, use 'to_text' to get
+        its textual (.hack) form.
         """
-        current_line = self._code[self._current_line_index]
-        hack_command = ""
+        if self._streaming:
+            token = self._pending_command
+            self._pending_command = next(self._code, None)
+        else:
+            token = self._code[self._current_line_index]
         # This is a A Command
-        if current_line.startswith(Parser.A_COMMAND_PREFIX):
-            hack_command = self._handle_A_command(current_line[1:])
+        if Parser.A_TOKEN == token[0]:
+            hack_command = self._handle_A_command(token[1])
         else: # This is a C Command
-            hack_command = self._handle_C_command(current_line)
+            hack_command = Parser._handle_C_command(*token[1:])
 
         # Incrementing the current line index
         self._current_line_index += 1
 
         return hack_command
 
-    def _handle_A_command(self, command: str) -> str:
+    def _handle_A_command(self, command: str) -> int:
         """
         """
         address = 0
@@ -124,18 +223,38 @@ class Parser:
             if self._symbol_manager.contains(command):
                 address = self._symbol_manager.get_address(command)
             else:
-                address = self._next_available_address
-                self._symbol_manager.add_entry(command, address)
-                # Incrementing the next available address, for when a new
-                # symbol appears
-                self._next_available_address += 1
+                # A new symbol which is not a label, hence a variable
+                address = self._symbol_manager.add_variable(command)
 
-        return Parser._pad_command(bin(address)[2:])
+        return Parser._validate_address(address)
 
-    def _handle_C_command(self, command: str) -> str:
+    @staticmethod
+    def _validate_address(address: int) -> int:
+        """
+        Validates that the given address fits into an A command
+        """
+        if address > Parser.MAX_ADDRESS:
+            raise ValueError(f"Parser: Address {address} exceeds 15 bits")
+
+        return address
+
+    @staticmethod
+    def _handle_C_command(command_dest: str, command_comp: str,
+                          command_jmp: str) -> int:
         """
         KeyError may be raised if the current command had any invalid assembly
-        procedures
+        procedures. Both the dest and jmp fields may be null (e.g. 'D' alone),
+        which computes without any effect, as disassembled machine code may
+        hold such commands
+        """
+        return Parser.COMP_CODES[command_comp] | \
+               Parser.DEST_CODES[command_dest] | \
+               Parser.JMP_CODES[command_jmp]
+
+    @staticmethod
+    def _split_C_command(command: str) -> Tuple[str, str, str]:
+        """
+        Splits a (cleaned) C command into its dest, comp & jmp fields
         """
         command_dest = Parser.OPT_OPCODE
         command_jmp = Parser.OPT_OPCODE
@@ -153,58 +272,211 @@ class Parser:
         if 2 == len(command_part2):
             command_jmp = command_part2[1]
 
-        # The C Command does not support both dest and jmp fields being null
-        # (e.g. commands like 'D' or 'M' alone)
-        if ((Parser.OPT_OPCODE == command_dest) and 
-            (Parser.OPT_OPCODE == command_jmp)):
-            raise Exception
-        
-        return Parser.COMP_COMMAND_PREFIX + \
-               Parser.COMP_OPCODES[command_comp] + \
-               Parser.DEST_OPCODES[command_dest] + \
-               Parser.JMP_OPCODES[command_jmp]
+        return command_dest, command_comp, command_jmp
 
     @staticmethod
-    def _pad_command(command: str) -> str:
-        """
-        Pads the given command to the standard word length as defined in the
-        specification of the Hack Computer
+    def has_numeric_jumps(code: List[Token]) -> bool:
+        """May any jump of the code target an address loaded as a number?
+        The code of such programs cannot be moved (only labels are
+        relocated). This is conservatively assumed if a number is jumped to
+        directly, or if the code jumps indirectly (to an address computed
+        at runtime, e.g. A=M;JMP) and reads a number which may be a ROM
+        address as data (e.g. a return address, @6 D=A).
+
+        Args:
+            code (List[Token]): the lexed commands of a program.
+
+        Returns:
+            bool: True if any jump may target a numeric address, False
+                otherwise.
         """
-        padded = command
-        while Parser.WORD_LEN != len(padded):
-            padded = "0" + padded
+        has_indirect_jumps = False
+        has_numeric_addresses = False
+        for index, token in enumerate(code):
+            if Parser.C_TOKEN == token[0]:
+                # A jump targets whatever A holds, it is direct only when
+                # A was just loaded
+                if (Parser.OPT_OPCODE != token[3] and
+                        (0 == index or Parser.A_TOKEN != code[index - 1][0])):
+                    has_indirect_jumps = True
+                continue
+            if Parser.A_TOKEN != token[0] or not token[1].isdigit():
+                continue
+            if index + 1 == len(code):
+                continue
+            next_token = code[index + 1]
+            if Parser.C_TOKEN != next_token[0]:
+                continue
+            if Parser.OPT_OPCODE != next_token[3]:
+                return True
+            # Numbers which are only used as RAM addresses (through M), or
+            # which are past the end of the code, are plain RAM constants
+            if "A" in next_token[2] and int(token[1]) <= len(code):
+                has_numeric_addresses = True
+        return has_indirect_jumps and has_numeric_addresses
 
-        return padded
+    @staticmethod
+    def to_text(command: int) -> str:
+        """
+        Renders the given command as a binary string of the standard word
+        length, as defined in the specification of the Hack Computer
+        """
+        return format(command, Parser.TEXT_FORMAT)
 
     @staticmethod
-    def _prepare_code(input_code: List[str]) -> Tuple[List[str], SymbolTable.SymbolTable]:
+    def _prepare_code(
+            input_code: List[str], source_lines: Optional[array.array] = None
+            ) -> Tuple[List[Token], SymbolTable.SymbolTable]:
         """
         Removes comments, strips whitespaces & translates labels
         """
+        return Parser._resolve_labels(Parser._lex_code(input_code, source_lines))
+
+    @staticmethod
+    def _resolve_labels(
+            tokens: Iterable[Token]
+            ) -> Tuple[List[Token], SymbolTable.SymbolTable]:
+        """
+        The label pass, translates the labels of the lexed code into ROM
+        addresses and drops them from the code
+        """
         symbol_manager = SymbolTable.SymbolTable()
         ready_code = []
-        for current_line in input_code:
-            # Removing whitespaces from everywhere
-            current_line = current_line.replace("\t", "")
-            current_line = current_line.replace(" ", "")
-
-            # Checking if line is a comment
-            comment_index = current_line.find(Parser.COMMENT_NOTATION)
-            if -1 != comment_index:
-                # Strip the line from everything past the comment
-                current_line = current_line[:comment_index]
-
-            # Checking if we landed on a label
-            if current_line.startswith("("):
-                # If the line doesn't end with an enclosing bracket, then
-                # this is not a proper label command, we throw an error
-                if not current_line.endswith(")"):
-                    raise Exception
-                
-                symbol_manager.add_entry(current_line.strip("()"), len(ready_code))
+        for token in tokens:
+            if Parser.LABEL_TOKEN == token[0]:
+                symbol_manager.add_entry(token[1], len(ready_code))
             else:
-                if 0 != len(current_line):
-                    ready_code.append(current_line)
+                ready_code.append(token)
 
         return ready_code, symbol_manager
 
+    @staticmethod
+    def _collect_labels(input_code: Iterable[str]) -> SymbolTable.SymbolTable:
+        """
+        The first pass of the streaming mode, translates labels without
+        keeping the code itself
+        """
+        symbol_manager = SymbolTable.SymbolTable()
+        rom_address = 0
+        for token in Parser._lex_code(input_code):
+            if Parser.LABEL_TOKEN == token[0]:
+                symbol_manager.add_entry(token[1], rom_address)
+            else:
+                rom_address += 1
+
+        return symbol_manager
+
+    @staticmethod
+    def _iterate_commands(
+            input_code: Iterable[str],
+            source_lines: Optional[array.array] = None) -> Iterator[Token]:
+        """
+        The second pass of the streaming mode, yields the lexed commands
+        (labels are skipped, as they were already translated)
+        """
+        for token in Parser._lex_code(input_code, source_lines):
+            if Parser.LABEL_TOKEN != token[0]:
+                yield token
+
+    @staticmethod
+    def _lex_code(
+            input_code: Iterable[str],
+            source_lines: Optional[array.array] = None,
+            max_known_tokens: int = MAX_KNOWN_TOKENS) -> Iterator[Token]:
+        """
+        Classifies and splits every meaningful line of the code into a token,
+        comments and whitespaces are dropped.
+        If source_lines is given, the (1-based) line number of each command
+        is appended to it. At most max_known_tokens lines are remembered
+        (none if it is 0)
+        """
+        if source_lines is not None:
+            yield from Parser._lex_numbered_code(input_code, source_lines)
+            return
+
+        match_line = Parser.LINE_PATTERN.fullmatch
+        # Generated code repeats the same few lines over and over, so every
+        # line is lexed only once (tokens are immutable, hence can be shared)
+        known_tokens = {}
+        for current_line in input_code:
+            token = known_tokens.get(current_line)
+            if token is None:
+                match = match_line(current_line)
+                if match is None:
+                    token = Parser._lex_line(current_line)
+                else:
+                    label, symbol, dest, comp, jmp = match.groups()
+                    if label is not None:
+                        token = (Parser.LABEL_TOKEN, label)
+                    elif symbol is not None:
+                        token = (Parser.A_TOKEN, symbol)
+                    elif comp is not None:
+                        token = (Parser.C_TOKEN, dest or Parser.OPT_OPCODE,
+                                 comp, jmp or Parser.OPT_OPCODE)
+
+                # Empty lines and comments have no token
+                if token is None:
+                    continue
+                if len(known_tokens) >= max_known_tokens:
+                    known_tokens.clear()
+                if max_known_tokens:
+                    known_tokens[current_line] = token
+
+            yield token
+
+    @staticmethod
+    def _lex_numbered_code(input_code: Iterable[str],
+                           source_lines: array.array) -> Iterator[Token]:
+        """
+        Lexes the code while recording the line number of each command,
+        kept apart from '_lex_code' so its fast path is not burdened by it
+        """
+        line_number = 0
+
+        def count_lines():
+            nonlocal line_number
+            for current_line in input_code:
+                line_number += 1
+                yield current_line
+
+        # The lexer consumes a single line at a time, hence each token is
+        # yielded right after its own line was counted
+        for token in Parser._lex_code(count_lines()):
+            if Parser.LABEL_TOKEN != token[0]:
+                source_lines.append(line_number)
+            yield token
+
+    @staticmethod
+    def _lex_line(current_line: str) -> Optional[Token]:
+        """
+        The slow path of the lexer, removes comments & strips whitespaces
+        before classifying the line, returns None for empty lines
+        """
+        # Removing whitespaces from everywhere (including the line
+        # terminator, which is kept when iterating a file)
+        current_line = current_line.rstrip("\r\n")
+        current_line = current_line.replace("\t", "")
+        current_line = current_line.replace(" ", "")
+
+        # Checking if line is a comment
+        comment_index = current_line.find(Parser.COMMENT_NOTATION)
+        if -1 != comment_index:
+            # Strip the line from everything past the comment
+            current_line = current_line[:comment_index]
+
+        # Checking if we landed on a label
+        if current_line.startswith("("):
+            # If the line doesn't end with an enclosing bracket, then
+            # this is not a proper label command, we throw an error
+            if not current_line.endswith(")"):
+                raise Exception
+
+            return Parser.LABEL_TOKEN, current_line.strip("()")
+
+        if 0 == len(current_line):
+            return None
+
+        if current_line.startswith(Parser.A_COMMAND_PREFIX):
+            return Parser.A_TOKEN, current_line[1:]
+
+        return (Parser.C_TOKEN,) + Parser._split_C_command(current_line)
@@ -0,0 +1,183 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+from typing import Dict, List, Optional, Tuple
+from Parser import Parser, Token
+from SymbolTable import SymbolKinds, SymbolTable
+
+#########
+# Rules #
+#########
+
+def is_A_command(token: Token) -> bool:
+    return Parser.A_TOKEN == token[0]
+
+def is_plain_C_command(token: Token) -> bool:
+    """
+    Is the token a C command which does not jump?
+    """
+    return Parser.C_TOKEN == token[0] and Parser.OPT_OPCODE == token[3]
+
+def dead_A_load(first: Token, second: Token) -> Optional[List[Token]]:
+    """
+    @X, @Y -> @Y
+    Loading A has no other effect, so a load which is immediately
+    overwritten is dead
+    """
+    if is_A_command(first) and is_A_command(second):
+        return [second]
+    return None
+
+def redundant_A_reload(first: Token, middle: Token,
+                       last: Token) -> Optional[List[Token]]:
+    """
+    @X, <C not writing A>, @X -> @X, <C not writing A>
+    """
+    if (is_A_command(first) and first == last and
+            Parser.C_TOKEN == middle[0] and "A" not in middle[1]):
+        return [first, middle]
+    return None
+
+# Pairs of C commands which cancel each other out, when executed one after
+# the other on the same A register
+CANCELLING_COMMANDS = [
+    (("M", "M+1"), ("M", "M-1")),
+    (("M", "M-1"), ("M", "M+1")),
+]
+
+def cancelling_commands(first: Token, second: Token) -> Optional[List[Token]]:
+    """
+    M=M+1, M=M-1 -> (nothing), and vice versa
+    """
+    if (is_plain_C_command(first) and is_plain_C_command(second) and
+            (first[1:3], second[1:3]) in CANCELLING_COMMANDS):
+        return []
+    return None
+
+def fold_D_store(first: Token, second: Token) -> Optional[List[Token]]:
+    """
+    D=<comp>, A=D -> AD=<comp>
+    D=<comp>, M=D -> MD=<comp>
+    The comp is computed once and written to both destinations
+    """
+    if (is_plain_C_command(first) and is_plain_C_command(second) and
+            "D" == first[1] and "D" == second[2] and second[1] in ["A", "M"]):
+        return [(Parser.C_TOKEN, second[1] + "D", first[2], Parser.OPT_OPCODE)]
+    return None
+
+class PeepholeOptimizer:
+    """Applies a table of safe peephole rewrites on an assembled program,
+    before it is encoded.
+    Labels are barriers: no rewrite spans a label, as control may reach it
+    from elsewhere. Hence, jumps must target labels: programs which may
+    jump to numeric ROM addresses (see Parser.has_numeric_jumps) are left
+    as they are, as these addresses would change.
+    """
+
+    # (name, window size, rule), rules are tried in order on the tail of the
+    # optimized code, whenever a command is added to it
+    RULES = [
+        ("dead A load", 2, dead_A_load),
+        ("redundant A reload", 3, redundant_A_reload),
+        ("cancelling commands", 2, cancelling_commands),
+        ("fold D store", 2, fold_D_store),
+    ]
+
+    def __init__(self) -> None:
+        """Creates a new optimizer, which counts the commands it saved."""
+        self._saved_commands = {name: 0 for name, _, _ in PeepholeOptimizer.RULES}
+        self._skipped = False
+
+    def optimize(self, code: List[Token], symbol_table: SymbolTable,
+                 source_lines: Optional[array.array] = None
+                 ) -> Tuple[List[Token], Optional[array.array]]:
+        """Optimizes the given code (which has no labels), the labels of the
+        symbol table are relocated accordingly.
+
+        Args:
+            code (List[Token]): the lexed commands of the program.
+            symbol_table (SymbolTable): the symbol table of the program.
+            source_lines (Optional[array.array]): the source line of each
+                command, if tracked.
+
+        Returns:
+            Tuple[List[Token], Optional[array.array]]: the optimized code,
+            and the source line of each of its commands, if tracked.
+        """
+        if Parser.has_numeric_jumps(code):
+            self._skipped = True
+            return code, source_lines
+
+        barriers = {address for address, _ in
+                    symbol_table.sorted_symbols(SymbolKinds.LABEL)}
+        relocations = {}
+        optimized_code = []
+        optimized_lines = []
+        # Rules may only look at the commands after the last barrier
+        window_start = 0
+        for index, token in enumerate(code):
+            if index in barriers:
+                relocations[index] = len(optimized_code)
+                window_start = len(optimized_code)
+            optimized_code.append(token)
+            optimized_lines.append(source_lines[index] if source_lines else 0)
+            self._apply_rules(optimized_code, optimized_lines, window_start)
+        relocations[len(code)] = len(optimized_code)
+
+        symbol_table.relocate_labels(relocations)
+        if source_lines is None:
+            return optimized_code, None
+        return optimized_code, array.array("l", optimized_lines)
+
+    def get_saved_commands(self) -> Dict[str, int]:
+        """Returns the amount of commands saved by each rule."""
+        return dict(self._saved_commands)
+
+    def get_total_saved_commands(self) -> int:
+        """Returns the amount of commands saved by all rules."""
+        return sum(self._saved_commands.values())
+
+    def __repr__(self) -> str:
+        if self._skipped:
+            return "PeepholeOptimizer(skipped, jumps to numeric addresses)"
+        saved_by_rules = ", ".join(
+            f"{count} by {name}"
+            for name, count in self._saved_commands.items() if count)
+        return (f"PeepholeOptimizer(saved {self.get_total_saved_commands()} "
+                f"commands{': ' + saved_by_rules if saved_by_rules else ''})")
+
+    def _apply_rules(self, code: List[Token], lines: List[int],
+                     window_start: int) -> None:
+        """
+        Rewrites the tail of the code for as long as any rule matches it
+        """
+        rewritten = True
+        while rewritten:
+            rewritten = False
+            for name, window_size, rule in PeepholeOptimizer.RULES:
+                if window_size > len(code) - window_start:
+                    continue
+                window = code[-window_size:]
+                replacement = rule(*window)
+                if replacement is None:
+                    continue
+
+                # Each remaining command keeps the source line of the
+                # command it came from (new commands take the first line)
+                window_lines = lines[-window_size:]
+                replacement_lines = []
+                for token in replacement:
+                    origin = next((i for i, original in enumerate(window)
+                                   if original is token), 0)
+                    replacement_lines.append(window_lines[origin])
+                code[-window_size:] = replacement
+                lines[-window_size:] = replacement_lines
+
+                self._saved_commands[name] += window_size - len(replacement)
+                rewritten = True
+                break
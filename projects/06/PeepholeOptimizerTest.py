@@ -0,0 +1,44 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import unittest
+
+from Main import assemble
+from PeepholeOptimizer import PeepholeOptimizer
+
+class PeepholeOptimizerTest(unittest.TestCase):
+    """Tests the rewrites of the PeepholeOptimizer."""
+
+    def test_dead_A_load(self) -> None:
+        """A load which is immediately overwritten is removed."""
+        optimizer = PeepholeOptimizer()
+        words, _ = assemble("@R1\n@R2\nM=1\n", optimizers=[optimizer])
+        self.assertEqual(words.tolist(), assemble("@R2\nM=1\n")[0].tolist())
+        self.assertEqual(optimizer.get_total_saved_commands(), 1)
+
+    def test_numeric_return_address(self) -> None:
+        """A return address loaded as a number (7, the @R2 after the call)
+        is jumped to indirectly, so the code must not move.
+        """
+        source = "\n".join([
+            "@7", "D=A", "@R0", "M=D",
+            "@R1", # A dead load, which would shift the return address
+            "@SUB", "0;JMP",
+            "@R2", "M=1",
+            "(END)", "@END", "0;JMP",
+            "(SUB)", "@R0", "A=M", "0;JMP"])
+        words, _ = assemble(source, optimizers=[PeepholeOptimizer()])
+        self.assertEqual(words.tolist(), assemble(source)[0].tolist())
+
+    def test_numeric_jump(self) -> None:
+        """A number which is jumped to directly keeps the code in place."""
+        source = "@R1\n@R2\nM=1\n@3\n0;JMP\n"
+        words, _ = assemble(source, optimizers=[PeepholeOptimizer()])
+        self.assertEqual(words.tolist(), assemble(source)[0].tolist())
+
+if "__main__" == __name__:
+    unittest.main()
@@ -0,0 +1,239 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# A macro invocation, the name of the macro followed by its arguments
+ExpansionKey = Tuple[str, ...]
+
+class Preprocessor:
+    """Expands the directives of an assembly program into plain assembly,
+    before it is assembled:
+
+        #include "Routines.asm"   - inserts the file (only once per program)
+        #macro INC var            - defines a macro with the given parameters,
+        @{var}                      which are referred to as {param} in its
+        M=M+1                       body, {#} is replaced by a number unique
+        #endmacro                   to each expansion (e.g. for labels)
+        #INC counter              - expands a macro
+
+    Each expansion is cached by its macro and arguments, so a macro invoked
+    again with the same arguments is not substituted (or parsed) again.
+    """
+
+    DIRECTIVE_PREFIX = "#"
+    INCLUDE_DIRECTIVE = "include"
+    MACRO_DIRECTIVE = "macro"
+    END_MACRO_DIRECTIVE = "endmacro"
+    UNIQUE_PLACEHOLDER = "{#}"
+    # A reference to a parameter, names which are not parameters (e.g. the
+    # unique placeholder) are kept as they are
+    PARAMETER_PATTERN = re.compile(r"\{([^{}]+)\}")
+    COMMENT_NOTATION = "//"
+
+    def __init__(self, include_dirs: Sequence[str] = ()) -> None:
+        """Creates a new preprocessor, for a single program.
+
+        Args:
+            include_dirs (Sequence[str]): directories searched for included
+                files, after the directory of the including file.
+        """
+        self._include_dirs = list(include_dirs)
+        # Mapping each macro to its parameters and its body
+        self._macros: Dict[str, Tuple[List[str], List[str]]] = {}
+        # Mapping each expansion to its lines (where the nested expansions
+        # are kept as their keys, as each of those is numbered on its own)
+        self._expansions: Dict[ExpansionKey,
+                               List[Union[str, ExpansionKey]]] = {}
+        self._included = set()
+        self._expansion_count = 0
+        self._cache_hits = 0
+
+    def preprocess_file(self, input_path: str) -> List[str]:
+        """Preprocesses the file at the given path.
+
+        Args:
+            input_path (str): the path of the program.
+
+        Returns:
+            List[str]: the lines of the preprocessed program.
+        """
+        input_path = os.path.abspath(input_path)
+        self._included.add(input_path)
+        with open(input_path, 'r') as input_file:
+            return self.preprocess(input_file, os.path.dirname(input_path))
+
+    def preprocess(self, input_code: Iterable[str],
+                   base_dir: str = os.curdir) -> List[str]:
+        """Preprocesses the given lines.
+
+        Args:
+            input_code (Iterable[str]): the lines of the program.
+            base_dir (str): the directory included files are relative to.
+
+        Returns:
+            List[str]: the lines of the preprocessed program.
+        """
+        output = []
+        self._process(iter(input_code), base_dir, output)
+        return output
+
+    def get_cache_hits(self) -> int:
+        """Returns the amount of expansions which were served from the
+        cache.
+        """
+        return self._cache_hits
+
+    def _process(self, input_code: Iterator[str], base_dir: str,
+                 output: List[str]) -> None:
+        """
+        Copies the plain lines to the output, while handling directives
+        """
+        for line in input_code:
+            line = line.rstrip("\r\n")
+            directive = Preprocessor._split_directive(line)
+            if directive is None:
+                output.append(line)
+                continue
+
+            name, args = directive[0], directive[1:]
+            if Preprocessor.INCLUDE_DIRECTIVE == name:
+                self._include(args, base_dir, output)
+            elif Preprocessor.MACRO_DIRECTIVE == name:
+                self._define(args, input_code)
+            elif Preprocessor.END_MACRO_DIRECTIVE == name:
+                raise ValueError(
+                    f"Preprocessor: #{name} without a matching #macro")
+            else:
+                self._emit(self._expand(directive, []), output)
+
+    @staticmethod
+    def _split_directive(line: str) -> Optional[ExpansionKey]:
+        """
+        Returns the name and arguments of a directive line, None if this
+        is a plain assembly line
+        """
+        line = line.split(Preprocessor.COMMENT_NOTATION, 1)[0].strip()
+        if not line.startswith(Preprocessor.DIRECTIVE_PREFIX):
+            return None
+        directive = tuple(line[len(Preprocessor.DIRECTIVE_PREFIX):]
+                          .replace(",", " ").split())
+        if not directive:
+            raise ValueError("Preprocessor: Missing directive name")
+        return directive
+
+    def _include(self, args: Sequence[str], base_dir: str,
+                 output: List[str]) -> None:
+        """
+        Inserts the processed lines of an included file, unless it was
+        already included
+        """
+        if 1 != len(args):
+            raise ValueError("Preprocessor: #include expects a single path")
+        include_path = Preprocessor._find_include(
+            args[0].strip('"'), [base_dir] + self._include_dirs)
+        if include_path in self._included:
+            return
+        self._included.add(include_path)
+        with open(include_path, 'r') as include_file:
+            self._process(include_file, os.path.dirname(include_path), output)
+
+    @staticmethod
+    def _find_include(path: str, search_dirs: List[str]) -> str:
+        """
+        Returns the absolute path of an included file
+        """
+        for search_dir in search_dirs:
+            candidate = os.path.abspath(os.path.join(search_dir, path))
+            if os.path.isfile(candidate):
+                return candidate
+        raise ValueError(f"Preprocessor: Cannot find included file {path}")
+
+    def _define(self, args: Sequence[str], input_code: Iterator[str]) -> None:
+        """
+        Defines a macro, its body is read up to the matching #endmacro
+        """
+        if not args:
+            raise ValueError("Preprocessor: #macro expects a name")
+        name, params = args[0], list(args[1:])
+        if name in [Preprocessor.INCLUDE_DIRECTIVE,
+                    Preprocessor.MACRO_DIRECTIVE,
+                    Preprocessor.END_MACRO_DIRECTIVE]:
+            raise ValueError(f"Preprocessor: #{name} cannot be a macro")
+
+        body = []
+        for line in input_code:
+            line = line.rstrip("\r\n")
+            directive = Preprocessor._split_directive(line)
+            if directive is not None and \
+                    Preprocessor.END_MACRO_DIRECTIVE == directive[0]:
+                break
+            body.append(line)
+        else:
+            raise ValueError(f"Preprocessor: Macro {name} has no #endmacro")
+
+        self._macros[name] = (params, body)
+        # A redefinition invalidates the expansions of the previous macro,
+        # including those nested in the expansions of other macros
+        self._expansions.clear()
+
+    def _expand(self, key: ExpansionKey,
+                expanding: List[str]) -> ExpansionKey:
+        """
+        Substitutes the arguments of a macro into its body, unless it was
+        already expanded with the same arguments. Returns the cache key
+        """
+        if key in self._expansions:
+            self._cache_hits += 1
+            return key
+
+        name, args = key[0], key[1:]
+        if name not in self._macros:
+            raise ValueError(f"Preprocessor: Unknown directive #{name}")
+        if name in expanding:
+            raise ValueError(f"Preprocessor: Macro {name} expands itself")
+        params, body = self._macros[name]
+        if len(params) != len(args):
+            raise ValueError(f"Preprocessor: Macro {name} expects "
+                             f"{len(params)} arguments, got {len(args)}")
+
+        # All the parameters are substituted at once, so an argument which
+        # looks like a parameter (e.g. {b}) is not substituted again
+        substitutions = dict(zip(params, args))
+        expansion = []
+        for line in body:
+            line = Preprocessor.PARAMETER_PATTERN.sub(
+                lambda match: substitutions.get(match.group(1), match.group(0)),
+                line)
+            directive = Preprocessor._split_directive(line)
+            if directive is None:
+                expansion.append(line)
+            elif directive[0] in [Preprocessor.INCLUDE_DIRECTIVE,
+                                  Preprocessor.MACRO_DIRECTIVE]:
+                raise ValueError(f"Preprocessor: #{directive[0]} cannot be "
+                                 f"used inside macro {name}")
+            else:
+                expansion.append(
+                    self._expand(directive, expanding + [name]))
+        self._expansions[key] = expansion
+        return key
+
+    def _emit(self, key: ExpansionKey, output: List[str]) -> None:
+        """
+        Writes a cached expansion to the output, numbering it (and each of
+        its nested expansions) uniquely
+        """
+        self._expansion_count += 1
+        unique = str(self._expansion_count)
+        for line in self._expansions[key]:
+            if isinstance(line, tuple):
+                self._emit(line, output)
+            else:
+                output.append(line.replace(Preprocessor.UNIQUE_PLACEHOLDER,
+                                           unique))
@@ -0,0 +1,29 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import unittest
+
+from Preprocessor import Preprocessor
+
+class PreprocessorTest(unittest.TestCase):
+    """Tests the expansion of macros by the Preprocessor."""
+
+    def test_arguments_are_not_substituted_again(self) -> None:
+        """An argument which looks like a parameter is kept as it is."""
+        code = ["#macro M a, b", "@{a}", "D=A", "@{b}", "#endmacro",
+                "#M {b}, 5"]
+        self.assertEqual(Preprocessor().preprocess(code),
+                         ["@{b}", "D=A", "@5"])
+
+    def test_unique_placeholder(self) -> None:
+        """Each expansion gets its own number, in place of {#}."""
+        code = ["#macro L x", "(L{#})", "@{x}", "#endmacro", "#L 1", "#L 2"]
+        self.assertEqual(Preprocessor().preprocess(code),
+                         ["(L1)", "@1", "(L2)", "@2"])
+
+if "__main__" == __name__:
+    unittest.main()
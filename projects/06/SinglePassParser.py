@@ -0,0 +1,100 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import array
+from typing import Dict, Iterable, Iterator, List, Optional
+from Parser import Parser
+import SymbolTable
+
+class SinglePassParser:
+    """Assembles a program while reading it only once, so it can be used
+    on input which cannot be re-read (e.g. a pipe).
+    Commands are encoded as they are read, A commands referring to symbols
+    which are still unknown are recorded in a fixup table, and are patched
+    once the whole program was read (as only then it is known whether the
+    symbol is a label defined later, or a variable).
+    """
+
+    def __init__(self, input_code: Iterable[str],
+                 track_lines: bool = False) -> None:
+        """Gets ready to assemble the given code.
+
+        Args:
+            input_code (Iterable[str]): the lines of the program, e.g. a file.
+            track_lines (bool): if this is True, the source line of each
+                command is recorded, see 'get_source_lines'.
+        """
+        self._input_code = input_code
+        self._source_lines = array.array("l") if track_lines else None
+        self._symbol_manager = SymbolTable.SymbolTable()
+        # Mapping each unresolved symbol to the indices of the words
+        # referring to it, in order of first appearance (which is also the
+        # order in which variables are allocated)
+        self._fixups: Dict[str, List[int]] = {}
+
+    def get_symbol_table(self) -> SymbolTable.SymbolTable:
+        """Returns the symbol table, which is complete only after assembly.
+        """
+        return self._symbol_manager
+
+    def get_source_lines(self) -> Optional[array.array]:
+        """Returns the (1-based) source line of each command, indexed by the
+        ROM address of the command, or None if lines are not tracked.
+        """
+        return self._source_lines
+
+    def iterate_commands(self) -> Iterator[int]:
+        """Yields all the assembled commands, see 'assemble'.
+        """
+        yield from self.assemble()
+
+    def assemble(self) -> array.array:
+        """Reads the whole program and assembles it.
+
+        Returns:
+            array.array: the assembled program, one word per instruction.
+        """
+        words = array.array("H")
+        for token in Parser._lex_code(self._input_code, self._source_lines):
+            if Parser.LABEL_TOKEN == token[0]:
+                self._symbol_manager.add_entry(token[1], len(words))
+            elif Parser.A_TOKEN == token[0]:
+                words.append(self._handle_A_command(token[1], len(words)))
+            else:
+                words.append(Parser._handle_C_command(*token[1:]))
+
+        self._backpatch(words)
+        return words
+
+    def _handle_A_command(self, command: str, index: int) -> int:
+        """
+        Encodes an A command, symbols which are still unknown are encoded
+        as 0 and recorded for backpatching
+        """
+        if command.isdecimal():
+            return Parser._validate_address(int(command))
+
+        if self._symbol_manager.contains(command):
+            return self._symbol_manager.get_address(command)
+
+        self._fixups.setdefault(command, []).append(index)
+        return 0
+
+    def _backpatch(self, words: array.array) -> None:
+        """
+        Patches all the recorded references, symbols which were not defined
+        as labels anywhere in the program are allocated as variables
+        """
+        for symbol, indices in self._fixups.items():
+            if self._symbol_manager.contains(symbol):
+                address = self._symbol_manager.get_address(symbol)
+            else:
+                address = self._symbol_manager.add_variable(symbol)
+
+            address = Parser._validate_address(address)
+            for index in indices:
+                words[index] = address
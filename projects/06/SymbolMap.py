@@ -0,0 +1,132 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import bisect
+import json
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+from SymbolTable import SymbolKinds, SymbolTable
+
+class SymbolMap:
+    """The labels, variables and source lines of an assembled program, so
+    a debugger or a profiler can resolve ROM addresses (e.g. PC samples)
+    without assembling the program again.
+    Everything is kept sorted by address, hence every lookup is a binary
+    search.
+    """
+
+    LABELS_KEY = "labels"
+    VARIABLES_KEY = "variables"
+    SOURCE_LINES_KEY = "source_lines"
+
+    def __init__(self, labels: List[Tuple[int, str]],
+                 variables: List[Tuple[int, str]],
+                 source_lines: Sequence[int]) -> None:
+        """
+        Args:
+            labels (List[Tuple[int, str]]): (ROM address, label) pairs,
+                sorted by address.
+            variables (List[Tuple[int, str]]): (RAM address, variable) pairs,
+                sorted by address.
+            source_lines (Sequence[int]): the source line of each command,
+                indexed by its ROM address.
+        """
+        self._labels = labels
+        self._label_addresses = [address for address, _ in labels]
+        self._variables = variables
+        self._source_lines = list(source_lines)
+
+    @staticmethod
+    def from_symbol_table(symbol_table: SymbolTable,
+                          source_lines: Sequence[int]) -> "SymbolMap":
+        """Creates the map of an assembled program.
+
+        Args:
+            symbol_table (SymbolTable): the symbol table of the program.
+            source_lines (Sequence[int]): the source line of each command,
+                indexed by its ROM address.
+        """
+        return SymbolMap(symbol_table.sorted_symbols(SymbolKinds.LABEL),
+                         symbol_table.sorted_symbols(SymbolKinds.VARIABLE),
+                         source_lines)
+
+    @staticmethod
+    def read(input_file: TextIO) -> "SymbolMap":
+        """Reads a map written by 'write'.
+
+        Args:
+            input_file (typing.TextIO): the map file.
+        """
+        content = json.load(input_file)
+        return SymbolMap(
+            [tuple(pair) for pair in content[SymbolMap.LABELS_KEY]],
+            [tuple(pair) for pair in content[SymbolMap.VARIABLES_KEY]],
+            content[SymbolMap.SOURCE_LINES_KEY])
+
+    def write(self, output_file: TextIO) -> None:
+        """Writes the map as JSON.
+
+        Args:
+            output_file (typing.TextIO): the map file.
+        """
+        json.dump({SymbolMap.LABELS_KEY: self._labels,
+                   SymbolMap.VARIABLES_KEY: self._variables,
+                   SymbolMap.SOURCE_LINES_KEY: self._source_lines},
+                  output_file, separators=(",", ":"))
+
+    def labels_by_address(self) -> Dict[int, List[str]]:
+        """
+        Returns:
+            Dict[int, List[str]]: the labels at each ROM address, in the
+            order of the map (which is by name, for the maps created by
+            'from_symbol_table').
+        """
+        labels = {}
+        for address, label in self._labels:
+            labels.setdefault(address, []).append(label)
+        return labels
+
+    def resolve_pc(self, pc: int) -> Optional[Tuple[str, int]]:
+        """Resolves a ROM address to the closest label at or before it.
+
+        Args:
+            pc (int): a ROM address.
+
+        Returns:
+            Optional[Tuple[str, int]]: the label and the offset of the
+            address from it, None if no label precedes the address.
+        """
+        index = bisect.bisect_right(self._label_addresses, pc) - 1
+        if 0 > index:
+            return None
+        address, label = self._labels[index]
+        return label, pc - address
+
+    def source_line(self, pc: int) -> Optional[int]:
+        """
+        Args:
+            pc (int): a ROM address.
+
+        Returns:
+            Optional[int]: the source line of the command at the address.
+        """
+        if 0 <= pc < len(self._source_lines):
+            return self._source_lines[pc]
+        return None
+
+    def rom_address(self, source_line: int) -> Optional[int]:
+        """
+        Args:
+            source_line (int): a line of the source.
+
+        Returns:
+            Optional[int]: the ROM address of the first command at or after
+            the given line, None if there are no such commands.
+        """
+        index = bisect.bisect_left(self._source_lines, source_line)
+        if index < len(self._source_lines):
+            return index
+        return None
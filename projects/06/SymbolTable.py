@@ -5,38 +5,120 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import array
+import sys
+from typing import Dict, List, Tuple
+
+
+class SymbolKinds:
+    """
+    A class to hold the different kinds of symbols in the Hack assembly.
+    """
+    PREDEFINED = 0
+    LABEL = 1
+    VARIABLE = 2
+    ALL = [PREDEFINED, LABEL, VARIABLE]
 
 
 class SymbolTable:
     """
-    A symbol table that keeps a correspondence between symbolic labels and 
+    A symbol table that keeps a correspondence between symbolic labels and
     numeric addresses.
+    Each symbol is interned and given a slot, the address and the kind of
+    every slot are kept in compact arrays.
     """
 
+    # Variables are allocated right after the R registers, and must not
+    # overflow into the memory map of the screen
+    FIRST_VARIABLE_ADDRESS = 16
+    SCREEN_ADDRESS = 0x4000
+
     def __init__(self) -> None:
         """Creates a new symbol table initialized with all the predefined symbols
         and their pre-allocated RAM addresses, according to section 6.2.3 of the
         book.
         """
-        self._symbols = {"SP": 0x0,
-                         "LCL": 0x1,
-                         "ARG": 0x2,
-                         "THIS": 0x3,
-                         "THAT": 0x4,
-                         "SCREEN": 0x4000,
-                         "KBD": 0x6000}
+        self._slots = {}
+        self._addresses = array.array("l")
+        self._kinds = bytearray()
+        self._counts = [0] * len(SymbolKinds.ALL)
+        self._next_variable_address = SymbolTable.FIRST_VARIABLE_ADDRESS
+
+        for symbol, address in [("SP", 0x0),
+                                ("LCL", 0x1),
+                                ("ARG", 0x2),
+                                ("THIS", 0x3),
+                                ("THAT", 0x4),
+                                ("SCREEN", SymbolTable.SCREEN_ADDRESS),
+                                ("KBD", 0x6000)]:
+            self.add_entry(symbol, address, SymbolKinds.PREDEFINED)
         # Creating al the R_registers iteratively
         for R_register in range(16):
-            self._symbols[f"R{R_register}"] = R_register
+            self.add_entry(f"R{R_register}", R_register, SymbolKinds.PREDEFINED)
 
-    def add_entry(self, symbol: str, address: int) -> None:
+    def add_entry(self, symbol: str, address: int,
+                  kind: int = SymbolKinds.LABEL) -> None:
         """Adds the pair (symbol, address) to the table.
+        If the symbol is already in the table, it is redefined.
 
         Args:
             symbol (str): the symbol to add.
             address (int): the address corresponding to the symbol.
+            kind (int): the kind of the symbol, as defined in SymbolKinds.
         """
-        self._symbols[symbol] = address
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = len(self._addresses)
+            self._slots[sys.intern(symbol)] = slot
+            self._addresses.append(address)
+            self._kinds.append(kind)
+        else:
+            self._counts[self._kinds[slot]] -= 1
+            self._addresses[slot] = address
+            self._kinds[slot] = kind
+        self._counts[kind] += 1
+
+    def add_variable(self, symbol: str) -> int:
+        """Allocates the next free RAM address to the given variable.
+
+        Args:
+            symbol (str): the variable to add.
+
+        Returns:
+            int: the address allocated to the variable.
+
+        Raises:
+            ValueError: if the variable would overflow into the screen.
+        """
+        address = self._next_variable_address
+        if SymbolTable.SCREEN_ADDRESS <= address:
+            raise ValueError(
+                f"SymbolTable: Variable {symbol} overflows into the screen")
+
+        self.add_entry(symbol, address, SymbolKinds.VARIABLE)
+        self._next_variable_address += 1
+        return address
+
+    def relocate_labels(self, relocations: Dict[int, int]) -> None:
+        """Moves every label to its new ROM address, after the code was
+        rewritten.
+
+        Args:
+            relocations (Dict[int, int]): the new address of each old label
+                address.
+        """
+        for slot in self._slots.values():
+            if SymbolKinds.LABEL == self._kinds[slot]:
+                self._addresses[slot] = relocations[self._addresses[slot]]
+
+    def remove_entry(self, symbol: str) -> None:
+        """Removes the symbol from the table (its slot is left unused).
+
+        Args:
+            symbol (str): a symbol contained in the table.
+        """
+        slot = self._slots.pop(symbol)
+        self._counts[self._kinds[slot]] -= 1
 
     def contains(self, symbol: str) -> bool:
         """Does the symbol table contain the given symbol?
@@ -47,7 +129,7 @@ class SymbolTable:
         Returns:
             bool: True if the symbol is contained, False otherwise.
         """
-        return symbol in self._symbols
+        return symbol in self._slots
 
     def get_address(self, symbol: str) -> int:
         """Returns the address associated with the symbol.
@@ -58,4 +140,52 @@ class SymbolTable:
         Returns:
             int: the address associated with the symbol.
         """
-        return self._symbols[symbol]
+        return self._addresses[self._slots[symbol]]
+
+    def get_kind(self, symbol: str) -> int:
+        """Returns the kind of the symbol.
+
+        Args:
+            symbol (str): a symbol.
+
+        Returns:
+            int: the kind of the symbol, as defined in SymbolKinds.
+        """
+        return self._kinds[self._slots[symbol]]
+
+    def sorted_symbols(self, kind: int) -> List[Tuple[int, str]]:
+        """
+        Args:
+            kind (int): the kind of symbols, as defined in SymbolKinds.
+
+        Returns:
+            List[Tuple[int, str]]: the (address, symbol) pairs of the given
+            kind, sorted by address.
+        """
+        return sorted((self._addresses[slot], symbol)
+                      for symbol, slot in self._slots.items()
+                      if kind == self._kinds[slot])
+
+    def count(self, kind: int) -> int:
+        """
+        Args:
+            kind (int): the kind of symbols, as defined in SymbolKinds.
+
+        Returns:
+            int: the number of symbols of the given kind in the table.
+        """
+        return self._counts[kind]
+
+    def ram_high_water_mark(self) -> int:
+        """
+        Returns:
+            int: the highest RAM address used by the predefined registers
+            (R15) or by the variables allocated so far.
+        """
+        return self._next_variable_address - 1
+
+    def __repr__(self) -> str:
+        return (f"SymbolTable({self.count(SymbolKinds.PREDEFINED)} predefined, "
+                f"{self.count(SymbolKinds.LABEL)} labels, "
+                f"{self.count(SymbolKinds.VARIABLE)} variables, "
+                f"RAM high-water mark {self.ram_high_water_mark()})")
@@ -5,7 +5,7 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
-from typing import List
+from typing import Collection, List, Optional
 
 ###################
 # Common ASM code #
@@ -85,6 +85,68 @@ def relation_asm(relation, count, uid):
         "M=D",
     ]
 
+def shared_relation_asm(relation, routine_label):
+    """
+    Hack ASM code of a routine for (in)equalities, which is shared by all
+    the uses of the relation. The return address is passed in D, and kept
+    in R13 (so only R13 & R15 are used)
+    """
+    # As in relation_asm, the relation is checked on y-x, which is only
+    # computed when x & y have the same sign (otherwise it may overflow),
+    # if the signs differ, D is set to a nonzero value with the sign of y-x
+    return [
+        f"({routine_label})",
+        "@R13",
+        "M=D", # Saving the return address
+        "@SP",
+        "AM=M-1",
+        "D=M",
+        "@R15",
+        "M=D", # Save the value of y in R15, next we load X into D
+        "@SP",
+        "A=M-1",
+        "D=M",
+        f"@{routine_label}_NEGATIVE_X",
+        "D;JLT",
+        # x >= 0, if y < 0 then y itself has the sign of y-x
+        "@R15",
+        "D=M",
+        f"@{routine_label}_COMPARE",
+        "D;JLT",
+        f"@{routine_label}_SAME_SIGNS",
+        "0;JMP",
+        # x < 0, if y >= 0 then y-x is positive
+        f"({routine_label}_NEGATIVE_X)",
+        "@R15",
+        "D=M",
+        f"@{routine_label}_SAME_SIGNS",
+        "D;JLT",
+        "D=1",
+        f"@{routine_label}_COMPARE",
+        "0;JMP",
+        f"({routine_label}_SAME_SIGNS)",
+        "@SP",
+        "A=M-1",
+        "D=M", # Loading x into D
+        "@R15",
+        "D=M-D", # Calculating y-x
+        f"({routine_label}_COMPARE)",
+        f"@{routine_label}_IS_TRUE",
+        f"D;{relation}",
+        "D=0",
+        f"@{routine_label}_SET_RESULT",
+        "0;JMP",
+        f"({routine_label}_IS_TRUE)",
+        "D=-1",
+        f"({routine_label}_SET_RESULT)",
+        "@SP",
+        "A=M-1",
+        "M=D",
+        "@R13", # Returning to the use site
+        "A=M",
+        "0;JMP"
+    ]
+
 def get_dynamic_segment_addr_asm(segment, address):
     """
     Hack ASM code for access to keyworded segments (e.g. local)
@@ -114,6 +176,10 @@ class CodeWriter:
     CONSTANT_SEGMENT_NOTATION = "constant"
     STATIC_SEGMENT_NOTATION = "static"
 
+    # The RAM addresses of the static variables of all files, [start, end)
+    STATIC_SEGMENT_START = 16
+    STATIC_SEGMENT_END = 256
+
     # Translating the name of each Dynamic Segment in 
     # VM language to the keyword of its address location
     # in ASM language.
@@ -131,12 +197,62 @@ class CodeWriter:
         "pointer": 3
     }
 
-    def __init__(self, unique_id: str) -> None:
+    # Labels of the routines shared by all the calls and returns of the
+    # program, when translating with shared calls (function labels are
+    # upper-cased VM names, which never start with an underscore)
+    CALL_ROUTINE_LABEL = "__VM_CALL"
+    RETURN_ROUTINE_LABEL = "__VM_RETURN"
+
+    # Labels of the routines shared by all the uses of each (in)equality,
+    # when translating with shared comparisons, keyed by the jump which
+    # checks the relation on y-x
+    COMPARISON_ROUTINE_LABELS = {
+        "JEQ": "__VM_EQ",
+        "JLT": "__VM_GT",
+        "JGT": "__VM_LT"
+    }
+    # The relation checked by each VM (in)equality, as above
+    COMPARISON_RELATIONS = {
+        "eq": "JEQ",
+        "gt": "JLT",
+        "lt": "JGT"
+    }
+
+    # Addressing a dynamic segment at a small offset walks A to the address
+    # (keeping D intact), larger offsets need D for the address
+    MAX_WALKED_OFFSET = 7
+
+    # When initializing locals quickly, zeroing them in a straight line is
+    # faster than any loop (2 cycles per local), so it is used unless its
+    # code is longer than the loop's by more than this amount of commands
+    MAX_EXTRA_LOCAL_INIT_COMMANDS = 16
+    # The amount of locals zeroed by each iteration of the loop
+    LOCAL_INIT_UNROLL = 4
+
+    def __init__(self, unique_id: str, shared_calls: bool = False,
+                 shared_comparisons: bool = False,
+                 fast_local_init: bool = False,
+                 static_base: Optional[int] = None) -> None:
         """
         Initializes the CodeWriter.
         @param unique_id: Unique Identifier for labeling
+        @param shared_calls: If True, every call and return jumps to a
+                             single routine (see vm_shared_routines),
+                             instead of inlining the whole calling convention
+        @param shared_comparisons: If True, every eq, gt & lt jumps to a
+                                   single routine of its relation
+        @param fast_local_init: If True, locals are initialized by the
+                                cheapest code for their amount (see
+                                vm_function), instead of a counted loop
+        @param static_base: If given, the static variables of this file are
+                            placed at this RAM address onwards, instead of
+                            being left for the assembler to allocate
         """
         self._uid = unique_id.upper()
+        self._shared_calls = shared_calls
+        self._shared_comparisons = shared_comparisons
+        self._fast_local_init = fast_local_init
+        self._static_base = static_base
         # Counting the amount of (in)equalities, so labels can be set properly
         # in the asm code
         self._eq_counter = 1
@@ -146,10 +262,14 @@ class CodeWriter:
         # for each return address of each call
         self._call_count = 1
 
-    def vm_bootstrap(self) -> str:
+    def vm_bootstrap(self,
+                     used_comparisons: Optional[Collection[str]] = None) -> str:
         """
+        Generating the Hack ASM code of the bootstrap, followed by the shared
+        routines (see vm_shared_routines)
+        @param used_comparisons: see vm_shared_routines
         """
-        return [
+        asm_code = [
             "// VM Bootstrap",
             "@256",
             "D=A",
@@ -157,6 +277,83 @@ class CodeWriter:
             "M=D"
         ] + self.vm_call("Sys.init", 0)
 
+        # The shared routines are placed once, right after the bootstrap
+        # (which never returns, so they are only reached by jumps)
+        return asm_code + self.vm_shared_routines(used_comparisons)
+
+    def vm_shared_routines(
+            self, used_comparisons: Optional[Collection[str]] = None
+            ) -> List[str]:
+        """
+        Generating the Hack ASM code of the routines shared by the whole
+        program, according to the translation mode
+        @param used_comparisons: The (in)equalities used by the program
+                                 (e.g. "eq"), only their routines are
+                                 placed. If None, all of them are placed
+        """
+        asm_code = []
+        if self._shared_calls:
+            asm_code += self._generate_call_routines()
+        if self._shared_comparisons:
+            for command, relation in CodeWriter.COMPARISON_RELATIONS.items():
+                if used_comparisons is not None and \
+                        command not in used_comparisons:
+                    continue
+                asm_code += [f"// shared {relation} routine"] + \
+                            shared_relation_asm(
+                                relation,
+                                CodeWriter.COMPARISON_ROUTINE_LABELS[relation])
+        return asm_code
+
+    def _generate_call_routines(self) -> List[str]:
+        """
+        Generating the Hack ASM code of the routines shared by all calls
+        and returns, each call site only sets up the return address (R13),
+        the called function (R14) and the argument count (D)
+        """
+        asm_code = [
+            "// shared call routine",
+            f"({CodeWriter.CALL_ROUTINE_LABEL})",
+            "@R15",
+            "M=D", # Saving the argument count in R15
+            "@R13",
+            "D=M", # Pushing the return address
+        ] + GENERIC_PUSH_D_REGISTER_ASM
+
+        asm_code += self._generate_frame_push()
+        # Same as the inlined call, but the argument count is in R15
+        asm_code += [
+            "@SP",
+            "D=M",
+            "@5",
+            "D=D-A",
+            "@R15",
+            "D=D-M", # Now we calculate SP-5-nArgs
+            "@ARG",
+            "M=D",
+            "@SP",
+            "D=M",
+            "@LCL",
+            "M=D",
+            "@R14", # Jumping to the called function
+            "A=M",
+            "0;JMP"
+        ]
+
+        asm_code += [
+            "// shared return routine",
+            f"({CodeWriter.RETURN_ROUTINE_LABEL})"
+        ] + self._generate_return()
+        return asm_code
+
+    def flush_stack_top(self) -> List[str]:
+        """
+        Generating the Hack ASM code which stores any part of the stack
+        which is not in memory (the whole stack is always in memory here,
+        see StackCachingCodeWriter)
+        """
+        return []
+
     #######################
     # Arithmetic commands #
     #######################
@@ -239,6 +436,12 @@ class CodeWriter:
         Returning Hack ASM for equality validation between the topmost 2
         items in the stack
         """
+        if self._shared_comparisons:
+            asm_code = ["// eq"] + self._generate_shared_comparison(
+                "JEQ", self._eq_counter)
+            self._eq_counter += 1
+            return asm_code
+
         # This is an optimzed version of the relation_asm function
         asm_code = [
             "// eq",
@@ -268,7 +471,11 @@ class CodeWriter:
         Returning Hack ASM for (strictly) greater-than between the
         topmost 2 items in the stack
         """
-        asm_code = ["// gt"] + relation_asm(relation="JLT", count=self._gt_counter, uid=self._uid)
+        if self._shared_comparisons:
+            asm_code = ["// gt"] + self._generate_shared_comparison(
+                "JLT", self._gt_counter)
+        else:
+            asm_code = ["// gt"] + relation_asm(relation="JLT", count=self._gt_counter, uid=self._uid)
         self._gt_counter += 1
         return asm_code
 
@@ -277,7 +484,11 @@ class CodeWriter:
         Returning the Hack ASM for (strictly) less-than between the topmost 
         2 items in the stack
         """
-        asm_code = ["// lt"] + relation_asm(relation="JGT", count=self._lt_counter, uid=self._uid)
+        if self._shared_comparisons:
+            asm_code = ["// lt"] + self._generate_shared_comparison(
+                "JGT", self._lt_counter)
+        else:
+            asm_code = ["// lt"] + relation_asm(relation="JGT", count=self._lt_counter, uid=self._uid)
         self._lt_counter += 1
         return asm_code
 
@@ -423,14 +634,26 @@ class CodeWriter:
     # Function Commands #
     #####################
 
-    def vm_function(self, name: str, local_var_count: int):
+    def vm_function(self, name: str, local_var_count: int,
+                    zero_locals: bool = True):
         """
+        Generating Hack ASM code for the entry of a function, which pushes
+        its locals.
+        @param zero_locals: If False, the locals are only reserved, as each
+                            of them is written before it is read (this is
+                            only done with fast local initialization)
         """
         asm_code = [f"// function {name} {local_var_count}"]
 
         func_label = name.upper()
         asm_code += [f"({func_label})"]
 
+        if self._fast_local_init:
+            if not zero_locals:
+                return asm_code + CodeWriter._generate_stack_reserve(local_var_count)
+            return asm_code + self._generate_local_init(func_label,
+                                                        local_var_count)
+
         if 0 < local_var_count:
             asm_code += [
                 f"({func_label})",
@@ -458,13 +681,10 @@ class CodeWriter:
         """
         asm_code = [f"// call {func_name} {argument_count}"]
         func_label = func_name.upper()
-        
-        # Generic Hack ASM code for pushing a Dynamic Segment's Address
-        # into the stack (as the regular vm_push is using segment names)
-        push_dynamic_segment_address_asm = lambda segment: [
-            f"@{segment}", 
-            "D=M", # Getting the segment address and place it in D register
-        ] + GENERIC_PUSH_D_REGISTER_ASM
+
+        if self._shared_calls:
+            return asm_code + self._generate_shared_call(func_label,
+                                                         argument_count)
 
         # Now we begin to push everything we need onto the stack
         # First we push the return address 
@@ -478,10 +698,7 @@ class CodeWriter:
         ] + GENERIC_PUSH_D_REGISTER_ASM
 
         # Pushing all the segment addresses
-        asm_code += push_dynamic_segment_address_asm(segment="LCL")
-        asm_code += push_dynamic_segment_address_asm(segment="ARG")
-        asm_code += push_dynamic_segment_address_asm(segment="THIS")
-        asm_code += push_dynamic_segment_address_asm(segment="THAT")
+        asm_code += self._generate_frame_push()
 
         # Setting the new ARG to point on the stack 
         # where we were BEFORE pushing the frame
@@ -519,6 +736,251 @@ class CodeWriter:
     def vm_return(self):
         """
         """
+        asm_code = ["// return"]
+        if self._shared_calls:
+            return asm_code + [
+                f"@{CodeWriter.RETURN_ROUTINE_LABEL}",
+                "0;JMP"
+            ]
+        return asm_code + self._generate_return()
+
+    ##################
+    # Fused Commands #
+    ##################
+
+    # Each fused command translates a short sequence of VM commands (see
+    # Parser.FUSION_PATTERNS) at once, returning None if it cannot do better
+    # than translating them one by one
+
+    def vm_fused_add_constant(self, amount: int) -> List[str]:
+        """
+        Generating Hack ASM code for "push constant N; add", adding N to
+        the topmost value in place
+        """
+        return [
+            f"// push constant {amount}; add",
+            f"@{amount}",
+            "D=A",
+            "@SP",
+            "A=M-1",
+            "M=D+M"
+        ]
+
+    def vm_fused_sub_constant(self, amount: int) -> List[str]:
+        """
+        Generating Hack ASM code for "push constant N; sub", subtracting N
+        from the topmost value in place
+        """
+        return [
+            f"// push constant {amount}; sub",
+            f"@{amount}",
+            "D=A",
+            "@SP",
+            "A=M-1",
+            "M=M-D"
+        ]
+
+    def vm_fused_increment(self, segment: str, address: int, command: str,
+                           amount: int) -> List[str]:
+        """
+        Generating Hack ASM code for "push X; push constant N; add; pop X"
+        (or sub), updating X in place without going through the stack
+        """
+        variable_address = self._generate_walked_address(segment, address)
+        if variable_address is None:
+            return None
+
+        asm_code = [f"// push {segment} {address}; push constant {amount}; "
+                    f"{command}; pop {segment} {address}"]
+        if 1 == amount:
+            return asm_code + variable_address + \
+                   ["M=M+1" if "add" == command else "M=M-1"]
+        return asm_code + [f"@{amount}", "D=A"] + variable_address + \
+               ["M=D+M" if "add" == command else "M=M-D"]
+
+    def vm_fused_dereference(self) -> List[str]:
+        """
+        Generating Hack ASM code for "pop pointer 1; push that 0", which
+        replaces the topmost value (an address) by the value it points to,
+        while setting THAT to the address
+        """
+        return [
+            "// pop pointer 1; push that 0",
+            "@SP",
+            "A=M-1",
+            "D=M"
+        ] + CodeWriter._generate_that_dereference() + [
+            "@SP",
+            "A=M-1",
+            "M=D"
+        ]
+
+    def vm_fused_push_dereference(self, segment: str,
+                                  address: int) -> List[str]:
+        """
+        Generating Hack ASM code for "push X; pop pointer 1; push that 0",
+        which sets THAT to X and pushes the value X points to
+        """
+        asm_code = [f"// push {segment} {address}; pop pointer 1; push that 0"]
+        if segment == CodeWriter.CONSTANT_SEGMENT_NOTATION:
+            asm_code += [f"@{address}", "D=A"]
+        else:
+            asm_code += self._generate_segment_address(segment, address) + ["D=M"]
+        return asm_code + CodeWriter._generate_that_dereference() + \
+               GENERIC_PUSH_D_REGISTER_ASM
+
+    #####################
+    # Utility functions #
+    #####################
+
+    @staticmethod
+    def _generate_stack_reserve(count: int) -> List[str]:
+        """
+        Generates the Hack ASM code which reserves the given amount of
+        entries on the stack (without initializing them), leaving the new
+        SP in A
+        """
+        if 0 == count:
+            return []
+        if count <= 2:
+            return ["@SP"] + ["M=M+1"] * (count - 1) + ["AM=M+1"]
+        return [
+            f"@{count}",
+            "D=A",
+            "@SP",
+            "AM=D+M"
+        ]
+
+    def _generate_local_init(self, func_label: str,
+                             local_var_count: int) -> List[str]:
+        """
+        Generates the Hack ASM code which pushes the given amount of zeroed
+        locals, either in a straight line or by a loop, the cheaper of both
+        """
+        # Zeroing the reserved entries from the top down
+        straight_line = CodeWriter._generate_stack_reserve(local_var_count) + \
+                        ["A=A-1", "M=0"] * local_var_count
+
+        # The locals which do not fill a whole iteration are zeroed first,
+        # each iteration then zeroes the LOCAL_INIT_UNROLL locals at SP-D
+        unroll = CodeWriter.LOCAL_INIT_UNROLL
+        remainder = local_var_count % unroll
+        loop = []
+        if remainder:
+            loop += ["@SP", "A=M", "M=0"] + ["A=A+1", "M=0"] * (remainder - 1)
+        loop += [
+            f"@{local_var_count}",
+            "D=A",
+            "@SP",
+            "M=D+M",
+            f"@{local_var_count - remainder}",
+            "D=A",
+            f"({func_label}_INIT_LOOP)",
+            "@SP",
+            "A=M-D"
+        ] + ["M=0", "A=A+1"] * (unroll - 1) + [
+            "M=0",
+            f"@{unroll}",
+            "D=D-A",
+            f"@{func_label}_INIT_LOOP",
+            "D;JGT"
+        ]
+
+        if local_var_count < unroll or \
+                len(straight_line) <= len(loop) + CodeWriter.MAX_EXTRA_LOCAL_INIT_COMMANDS:
+            return straight_line
+        return loop
+
+    @staticmethod
+    def _generate_that_dereference() -> List[str]:
+        """
+        Generates the Hack ASM code which sets THAT to the address in D,
+        and loads the value it points to into D
+        """
+        return [
+            "@THAT",
+            "M=D",
+            "A=D",
+            "D=M"
+        ]
+
+    def _generate_walked_address(self, segment: str, address: int) -> List[str]:
+        """
+        Generates the Hack ASM code which places the requested address within
+        a segment in A without using D, None if this is not possible (the
+        constant segment, or a dynamic segment at a large offset)
+        """
+        if segment == CodeWriter.CONSTANT_SEGMENT_NOTATION:
+            return None
+        if segment not in CodeWriter.DYNAMIC_SEGMENTS_MAPPING:
+            # Static & fixed segments are addressed directly
+            return self._generate_segment_address(segment, address)
+        if address > CodeWriter.MAX_WALKED_OFFSET:
+            return None
+        return [f"@{CodeWriter.DYNAMIC_SEGMENTS_MAPPING[segment]}", "A=M"] + \
+               ["A=A+1"] * address
+
+    def _generate_shared_call(self, func_label: str, argument_count: int):
+        """
+        Generates the Hack ASM code of a call site, when calls are shared.
+        The return address and the called function are passed in R13 & R14,
+        and the argument count in D (see vm_shared_routines)
+        """
+        return_label = f"RET_{func_label}_{self._call_count}_{self._uid}"
+        self._call_count += 1
+        return [
+            f"@{return_label}",
+            "D=A",
+            "@R13",
+            "M=D",
+            f"@{func_label}",
+            "D=A",
+            "@R14",
+            "M=D",
+            f"@{argument_count}",
+            "D=A",
+            f"@{CodeWriter.CALL_ROUTINE_LABEL}",
+            "0;JMP",
+            f"({return_label})"
+        ]
+
+    def _generate_shared_comparison(self, relation: str, count: int):
+        """
+        Generates the Hack ASM code of an (in)equality, when comparisons
+        are shared. The return address is passed in D (see
+        shared_relation_asm)
+        """
+        return_label = f"RET_CMP_{relation}_{count}_{self._uid}"
+        return [
+            f"@{return_label}",
+            "D=A",
+            f"@{CodeWriter.COMPARISON_ROUTINE_LABELS[relation]}",
+            "0;JMP",
+            f"({return_label})"
+        ]
+
+    @staticmethod
+    def _generate_frame_push():
+        """
+        Generates the Hack ASM code for pushing the segment addresses of the
+        caller, as part of its call frame
+        """
+        # Generic Hack ASM code for pushing a Dynamic Segment's Address
+        # into the stack (as the regular vm_push is using segment names)
+        push_dynamic_segment_address_asm = lambda segment: [
+            f"@{segment}",
+            "D=M", # Getting the segment address and place it in D register
+        ] + GENERIC_PUSH_D_REGISTER_ASM
+
+        return push_dynamic_segment_address_asm(segment="LCL") + \
+               push_dynamic_segment_address_asm(segment="ARG") + \
+               push_dynamic_segment_address_asm(segment="THIS") + \
+               push_dynamic_segment_address_asm(segment="THAT")
+
+    def _generate_return(self):
+        """
+        Generates the Hack ASM code which returns from the current function
+        """
         # Generic Hack ASM code for getting data from a certain offset within the call frame,
         # the data is then put into the D register
         get_data_from_frame_asm = lambda offset: [
@@ -529,10 +991,8 @@ class CodeWriter:
             "D=M", # Storing the ptr to the segment in D
         ]
 
-        asm_code = ["// return"]
-
         # Storing the end of the call frame in R15
-        asm_code += [
+        asm_code = [
             "@LCL",
             "D=M",
             "@R15",
@@ -591,10 +1051,6 @@ class CodeWriter:
 
         return asm_code
 
-    #####################
-    # Utility functions #
-    #####################
-
     def _generate_segment_address(self, segment: str, internal_address: int) -> str:
         """
         Calling this function will generate Hack ASM code which places
@@ -607,6 +1063,8 @@ class CodeWriter:
                 segment=CodeWriter.DYNAMIC_SEGMENTS_MAPPING[segment], address=internal_address)
         # Static segment is a special case
         elif CodeWriter.STATIC_SEGMENT_NOTATION == segment:
+            if self._static_base is not None:
+                return [f"@{self._static_base + internal_address}"]
             return [f"@{self._uid}.STATIC_VAR.{internal_address}"]
         else: # Fixed Segments
             return CodeWriter._generate_address_by_offset(
@@ -0,0 +1,272 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+from typing import Dict, List, Optional, Tuple
+
+# A VM command, split into its tokens
+Command = List[str]
+
+WORD_MASK = 0xFFFF
+MAX_CONSTANT = 0x7FFF
+
+def to_signed(value: int) -> int:
+    """
+    Interprets a 16-bit word as a two's complement number
+    """
+    return value - (WORD_MASK + 1) if value > MAX_CONSTANT else value
+
+def from_bool(value: bool) -> int:
+    """
+    VM booleans, true is -1 and false is 0
+    """
+    return WORD_MASK if value else 0
+
+class ConstantFolder:
+    """Folds the constant computations of a VM program, before it is
+    translated:
+
+        push constant 2, push constant 3, add   ->  push constant 5
+        push constant 0, not, if-goto L         ->  goto L
+        push constant 0, if-goto L              ->  (nothing)
+
+    Values are also propagated through the variables (local, argument,
+    static & temp) within a basic block: a variable which was popped a
+    known value is pushed as that value, until a label, a call, or a pop
+    into this/that (which may alias any of them).
+    Constants are only materialized (pushed) once a command needs them on
+    the stack, and values which do not fit a push are pushed as the
+    complement of a constant.
+    """
+
+    UNARY_OPERATIONS = {
+        "neg": lambda x: -x,
+        "not": lambda x: ~x,
+        "shiftleft": lambda x: x << 1,
+        # The shift is arithmetic, as the MSB is kept
+        "shiftright": lambda x: to_signed(x) >> 1
+    }
+
+    BINARY_OPERATIONS = {
+        "add": lambda x, y: x + y,
+        "sub": lambda x, y: x - y,
+        "and": lambda x, y: x & y,
+        "or": lambda x, y: x | y
+    }
+
+    # (In)equalities are compared on the signed values, as translated
+    COMPARISONS = {
+        "eq": lambda x, y: x == y,
+        "gt": lambda x, y: to_signed(x) > to_signed(y),
+        "lt": lambda x, y: to_signed(x) < to_signed(y)
+    }
+
+    # The segments whose values are propagated, none of them can be written
+    # through another segment (except for this & that, which may point
+    # anywhere)
+    PROPAGATED_SEGMENTS = ["local", "argument", "static", "temp"]
+    ALIASING_SEGMENTS = ["this", "that"]
+
+    # Commands which control may reach from elsewhere, or which may write
+    # any variable, so nothing is known about the variables after them
+    BARRIER_COMMANDS = ["label", "function", "call"]
+
+    def __init__(self) -> None:
+        """Creates a new folder, which counts the commands it folded."""
+        self._folded_counts = {
+            "arithmetic": 0,
+            "comparisons": 0,
+            "conditions": 0,
+            "propagated": 0
+        }
+        self._saved_commands = 0
+        # The constants on top of the stack which were not pushed yet, each
+        # with the push it came from (None for computed values)
+        self._pending: List[Tuple[int, Optional[Command]]] = []
+        # The known values of variables, keyed by (segment, index)
+        self._known: Dict[Tuple[str, str], int] = {}
+
+    def fold(self, commands: List[Command]) -> List[Command]:
+        """Folds the constant computations of a whole VM file.
+
+        Args:
+            commands (List[Command]): the commands of the file, split into
+                tokens (without empty commands).
+
+        Returns:
+            List[Command]: the folded commands.
+        """
+        self._pending = []
+        self._known = {}
+        folded = []
+        for command in commands:
+            if not self._fold_command(command, folded):
+                # A pop of a pending constant pops the last one
+                top = self._pending[-1][0] if self._pending else None
+                folded += self._materialize()
+                self._update_known(command, top)
+                folded.append(command)
+        folded += self._materialize()
+        self._saved_commands += len(commands) - len(folded)
+        return folded
+
+    def get_folded_counts(self) -> Dict[str, int]:
+        """Returns the amount of commands folded, by kind."""
+        return dict(self._folded_counts)
+
+    def get_saved_commands(self) -> int:
+        """Returns the amount of commands saved by folding."""
+        return self._saved_commands
+
+    def __repr__(self) -> str:
+        folded_kinds = ", ".join(f"{count} {kind}"
+                                 for kind, count in self._folded_counts.items()
+                                 if count)
+        return (f"ConstantFolder(saved {self._saved_commands} commands"
+                f"{': folded ' + folded_kinds if folded_kinds else ''})")
+
+    def _fold_command(self, command: Command, folded: List[Command]) -> bool:
+        """
+        Folds a single command into the pending constants, returns whether
+        it was folded
+        """
+        name = command[0]
+        if "push" == name:
+            value = self._get_known_value(command[1], command[2])
+            if value is None:
+                return False
+            self._pending.append((value, command))
+            return True
+
+        if "if-goto" == name:
+            if not self._pending:
+                return False
+            # The condition is known, so this either always jumps or never
+            if self._pop_pending():
+                folded += self._materialize() + [["goto", command[1]]]
+            self._folded_counts["conditions"] += 1
+            return True
+
+        if name in ConstantFolder.UNARY_OPERATIONS and self._pending:
+            self._pending.append((ConstantFolder.UNARY_OPERATIONS[name](
+                self._pop_pending()) & WORD_MASK, None))
+            self._folded_counts["arithmetic"] += 1
+            return True
+        if len(self._pending) < 2:
+            return False
+        if name in ConstantFolder.BINARY_OPERATIONS:
+            y, x = self._pop_pending(), self._pop_pending()
+            self._pending.append(
+                (ConstantFolder.BINARY_OPERATIONS[name](x, y) & WORD_MASK, None))
+            self._folded_counts["arithmetic"] += 1
+            return True
+        if name in ConstantFolder.COMPARISONS:
+            y, x = self._pop_pending(), self._pop_pending()
+            self._pending.append(
+                (from_bool(ConstantFolder.COMPARISONS[name](x, y)), None))
+            self._folded_counts["comparisons"] += 1
+            return True
+        return False
+
+    def _pop_pending(self) -> int:
+        """
+        Pops the topmost pending constant, which is folded into a command
+        """
+        value, push_command = self._pending.pop()
+        if push_command is not None and "constant" != push_command[1]:
+            self._folded_counts["propagated"] += 1
+        return value
+
+    def _get_known_value(self, segment: str, index: str) -> Optional[int]:
+        """
+        Returns the value a push would push, None if it is not known
+        """
+        if "constant" == segment:
+            return int(index) & WORD_MASK
+        return self._known.get((segment, index))
+
+    def _update_known(self, command: Command, top: Optional[int]) -> None:
+        """
+        Updates the known values of variables after a command which was not
+        folded, given the value on top of the stack before it (if known)
+        """
+        name = command[0]
+        if name in ConstantFolder.BARRIER_COMMANDS:
+            self._known.clear()
+        elif "pop" == name:
+            segment, index = command[1], command[2]
+            if segment in ConstantFolder.ALIASING_SEGMENTS:
+                self._known.clear()
+            elif segment in ConstantFolder.PROPAGATED_SEGMENTS:
+                if top is None:
+                    self._known.pop((segment, index), None)
+                else:
+                    self._known[(segment, index)] = top
+
+    def _materialize(self) -> List[Command]:
+        """
+        Returns the commands which push the pending constants, unfolded
+        pushes are kept as they were
+        """
+        commands = []
+        for value, push_command in self._pending:
+            if push_command is not None:
+                commands.append(push_command)
+            elif value <= MAX_CONSTANT:
+                commands.append(["push", "constant", str(value)])
+            else:
+                commands += [["push", "constant", str(value ^ WORD_MASK)],
+                             ["not"]]
+        self._pending = []
+        return commands
+
+def fold_file(input_path: str, output_path: str) -> ConstantFolder:
+    """Folds the constant computations of a VM file.
+
+    Args:
+        input_path (str): the VM file to fold.
+        output_path (str): writes the folded VM file to this path (which
+            may be the input path).
+
+    Returns:
+        ConstantFolder: the folder of the file, with its counts.
+    """
+    with open(input_path, 'r') as input_file:
+        commands = [line.split("//", 1)[0].split() for line in input_file]
+    folder = ConstantFolder()
+    commands = folder.fold([command for command in commands if command])
+    with open(output_path, 'w') as output_file:
+        for command in commands:
+            output_file.write(" ".join(command) + "\n")
+    return folder
+
+if "__main__" == __name__:
+    arg_parser = argparse.ArgumentParser(prog="ConstantFolder")
+    arg_parser.add_argument("input_path",
+                            help="a .vm file or a directory of .vm files, "
+                                 "which are folded in place")
+    arg_parser.add_argument("--output-dir",
+                            help="writes the folded files to this directory, "
+                                 "instead of in place")
+    args = arg_parser.parse_args()
+
+    argument_path = os.path.abspath(args.input_path)
+    if os.path.isdir(argument_path):
+        files_to_fold = [os.path.join(argument_path, filename)
+                         for filename in sorted(os.listdir(argument_path))]
+    else:
+        files_to_fold = [argument_path]
+    for input_path in files_to_fold:
+        if os.path.splitext(input_path)[1].lower() != ".vm":
+            continue
+        output_path = input_path
+        if args.output_dir is not None:
+            output_path = os.path.join(args.output_dir,
+                                       os.path.basename(input_path))
+        print(f"{os.path.basename(input_path)}: "
+              f"{fold_file(input_path, output_path)}")
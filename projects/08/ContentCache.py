@@ -0,0 +1,129 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import functools
+import hashlib
+import os
+from typing import Callable, Optional, Tuple
+
+class ContentCache:
+    """An on-disk cache of build outputs, keyed by a hash of the code, the
+    options affecting the output and the sources of the tool itself.
+    The cache is bounded in size: once a build is done, 'evict' removes the
+    least recently used entries (the modification time of an entry is its
+    last use).
+    This file is identical in the assembler (projects/06) and in the VM
+    translator (projects/08), as neither project may import the other. Each
+    of them subclasses it, only setting the extension of the entries and
+    the sources hashed into the keys.
+    """
+
+    ENTRY_EXTENSION = ""
+    # The modules (next to this file) whose content affects the output
+    SOURCE_MODULES: Tuple[str, ...] = ()
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, cache_dir: str, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """Opens the cache at the given directory, creating it if needed.
+
+        Args:
+            cache_dir (str): the directory holding the cached entries.
+            max_size (int): the maximal total size of the cache, in bytes.
+        """
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def version(cls) -> str:
+        """Returns a hash of the tool's sources, so any change to the tool
+        invalidates the previously cached entries.
+        """
+        return ContentCache._hash_sources(tuple(cls.SOURCE_MODULES))
+
+    @classmethod
+    def key(cls, code: bytes, *options: str) -> str:
+        """Returns the cache key of the given code.
+
+        Args:
+            code (bytes): the content of the input file.
+            options (str): anything else affecting the output (e.g. the
+                output format, or the name of the file).
+        """
+        key_hash = hashlib.sha256(cls.version().encode())
+        for option in options:
+            key_hash.update(b"\0" + option.encode())
+        key_hash.update(b"\0" + code)
+        return key_hash.hexdigest()
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache fits its
+        maximal size. The whole cache is scanned, hence this is done once
+        per build rather than on every store.
+        """
+        entries = []
+        for entry in os.scandir(self._cache_dir):
+            if entry.name.endswith(self.ENTRY_EXTENSION):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self._max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _hash_sources(source_modules: Tuple[str, ...]) -> str:
+        """
+        Hashes the content of the given modules, once per process
+        """
+        source_dir = os.path.dirname(os.path.abspath(__file__))
+        version_hash = hashlib.sha256()
+        for source_module in source_modules:
+            source_path = os.path.join(source_dir, source_module)
+            with open(source_path, 'rb') as source_file:
+                version_hash.update(source_file.read())
+        return version_hash.hexdigest()
+
+    def _use_entry(self, key: str) -> Optional[str]:
+        """
+        Returns the path of the entry of the given key, marking it as
+        recently used, None if it is not cached
+        """
+        entry_path = self._entry_path(key)
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # Either not cached or evicted by a concurrent build
+            return None
+        return entry_path
+
+    def _add_entry(self, key: str, write_entry: Callable[[str], None]) -> None:
+        """
+        Adds the entry of the given key, which is written into a temporary
+        file first (by the given function), so concurrent builds never see
+        a partially written entry
+        """
+        entry_path = self._entry_path(key)
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        write_entry(temp_path)
+        os.replace(temp_path, entry_path)
+
+    def _entry_path(self, key: str) -> str:
+        """
+        Returns the path of the entry of the given key
+        """
+        return os.path.join(self._cache_dir, key + self.ENTRY_EXTENSION)
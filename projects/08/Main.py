@@ -5,16 +5,53 @@ was written by Aviv Yaish. It is an extension to the specifications given
 as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import concurrent.futures
+import functools
+import io
+import itertools
 import os
 import sys
 import typing
 from Parser import Parser
 from CodeWriter import CodeWriter
+from TranslationCache import TranslationCache
+
+# The unique ID of the bootstrap, when it is translated on its own
+BOOTSTRAP_UNIQUE_ID = "__BOOTSTRAP"
+
+# The amount of ASM lines joined into each write to the output file
+WRITE_BATCH_LINES = 4096
+
+
+def write_lines(output_file: typing.TextIO,
+                lines: typing.Iterable[str]) -> None:
+    """Writes the given lines to the output file, in batches of
+    WRITE_BATCH_LINES, so only a single batch is held in memory at a time
+    (while writing each line on its own is much slower).
+
+    Args:
+        output_file (typing.TextIO): writes all output to this file.
+        lines (typing.Iterable[str]): the lines to write.
+    """
+    lines = iter(lines)
+    batch = list(itertools.islice(lines, WRITE_BATCH_LINES))
+    while batch:
+        output_file.write("\n".join(batch) + "\n")
+        batch = list(itertools.islice(lines, WRITE_BATCH_LINES))
 
 
 def translate_file(
         input_file: typing.TextIO, output_file: typing.TextIO,
-        bootstrap: bool) -> None:
+        bootstrap: bool, shared_calls: bool = False,
+        shared_comparisons: bool = False,
+        cache_stack_top: bool = False,
+        fuse_commands: bool = False,
+        fold_constants: bool = False,
+        fast_local_init: bool = False,
+        static_base: typing.Optional[int] = None,
+        used_comparisons: typing.Optional[typing.Collection[str]] = None
+        ) -> typing.Dict[str, int]:
     """Translates a single file.
 
     Args:
@@ -22,21 +59,179 @@ def translate_file(
         output_file (typing.TextIO): writes all output to this file.
         bootstrap (bool): if this is True, the current file is the 
             first file we are translating.
+        shared_calls (bool): if this is True, calls and returns jump to
+            routines shared by the whole program (which are placed after
+            the bootstrap), instead of being inlined.
+        shared_comparisons (bool): if this is True, every (in)equality
+            jumps to a routine shared by the whole program (which is placed
+            after the bootstrap), instead of being inlined.
+        cache_stack_top (bool): if this is True, the top of the stack is
+            kept in D across consecutive commands, see StackCachingCodeWriter.
+        fuse_commands (bool): if this is True, common sequences of commands
+            are translated at once, see Parser.FUSION_PATTERNS.
+        fold_constants (bool): if this is True, constant computations are
+            folded before translating, see ConstantFolder.
+        fast_local_init (bool): if this is True, locals are initialized by
+            the cheapest code for their amount, and only when needed.
+        static_base (typing.Optional[int]): if given, the static variables
+            of the file are placed at this RAM address onwards, see
+            allocate_statics.
+        used_comparisons (typing.Optional[typing.Collection[str]]): if
+            given, only the shared routines of these (in)equalities are
+            placed after the bootstrap, see find_used_comparisons.
+
+    Returns:
+        typing.Dict[str, int]: the amount of times each sequence of commands
+            was fused.
     """
-    parser = Parser(input_file)
+    parser = Parser(input_file, shared_calls, shared_comparisons,
+                    cache_stack_top, fuse_commands, fold_constants,
+                    fast_local_init, static_base)
     
     # Adding the name of the file to the beginning of the ASM sequence
     output_file.write(f"// {os.path.basename(input_file.name)}\n")
 
     # First, if bootstrap code is required, we call it
     if bootstrap:
-        output_file.write(parser.get_bootstrap_code() + "\n")
+        output_file.write(parser.get_bootstrap_code(used_comparisons) + "\n")
+
+    # Only then, we generate the VM-file's ASM code, which is streamed
+    # into the output file
+    write_lines(output_file, parser.iterate_translation())
+    return parser.get_fusion_counts()
 
-    # Only then, we generate the VM-file's ASM code
-    asm = parser.parse_translate()
-    output_file.write(asm + "\n")
+def translate_cached(
+        input_path: str, output_file: typing.TextIO, cache: TranslationCache,
+        **options) -> typing.Optional[typing.Dict[str, int]]:
+    """Translates a single file (without bootstrap), unless its fragment is
+    in the translation cache.
+
+    Args:
+        input_path (str): the path of the file to translate.
+        output_file (typing.TextIO): writes all output to this file.
+        cache (TranslationCache): the cache of translated fragments.
+        options: the translation options, see 'translate_file'.
+
+    Returns:
+        typing.Optional[typing.Dict[str, int]]: the amount of times each
+            sequence of commands was fused, None if the file was served
+            from the translation cache.
+    """
+    with open(input_path, 'rb') as input_file:
+        code = input_file.read()
+    # The labels of the fragment are made of the name of the file
+    cache_key = TranslationCache.key(
+        code, os.path.basename(input_path),
+        *(f"{name}={value}" for name, value in sorted(options.items())))
+    fragment = cache.fetch(cache_key)
+    if fragment is not None:
+        output_file.write(fragment)
+        return None
+
+    fragment_file = io.StringIO()
+    with open(input_path, 'r') as input_file:
+        fusion_counts = translate_file(input_file, fragment_file, False,
+                                       **options)
+    cache.store(cache_key, fragment_file.getvalue())
+    output_file.write(fragment_file.getvalue())
+    return fusion_counts
+
+def translate_path(
+        input_path: str, bootstrap: bool,
+        static_base: typing.Optional[int] = None,
+        used_comparisons: typing.Optional[typing.Collection[str]] = None,
+        cache_dir: typing.Optional[str] = None,
+        cache_size: int = TranslationCache.DEFAULT_MAX_SIZE, **options
+        ) -> typing.Tuple[str, typing.Optional[typing.Dict[str, int]]]:
+    """Translates the file at the given path into a fragment of the output,
+    so files can be translated by separate processes.
+
+    Args:
+        input_path (str): the path of the file to translate.
+        bootstrap (bool): if this is True, the current file is the first
+            file we are translating (ignored when the cache is used).
+        static_base (typing.Optional[int]): see 'translate_file'.
+        used_comparisons (typing.Optional[typing.Collection[str]]): see
+            'translate_file'.
+        cache_dir (typing.Optional[str]): if given, the fragment is served
+            from the translation cache at this directory, if possible.
+        cache_size (int): the maximal size of the translation cache, in
+            bytes.
+        options: the rest of the translation options, see 'translate_file'.
 
-def main(in_path):
+    Returns:
+        typing.Tuple[str, typing.Optional[typing.Dict[str, int]]]: the ASM
+            fragment of the file, and the result of 'translate_file' (None
+            if the file was served from the translation cache).
+    """
+    fragment_file = io.StringIO()
+    if cache_dir is not None:
+        fusion_counts = translate_cached(
+            input_path, fragment_file, TranslationCache(cache_dir, cache_size),
+            static_base=static_base, **options)
+    else:
+        with open(input_path, 'r') as input_file:
+            fusion_counts = translate_file(
+                input_file, fragment_file, bootstrap,
+                static_base=static_base, used_comparisons=used_comparisons,
+                **options)
+    return fragment_file.getvalue(), fusion_counts
+
+def allocate_statics(
+        input_paths: typing.List[str]) -> typing.Dict[str, int]:
+    """Allocates the static variables of all the files of a program, like a
+    linker would, so they are translated to numeric addresses.
+
+    Args:
+        input_paths (typing.List[str]): the .vm files of the program.
+
+    Returns:
+        typing.Dict[str, int]: the RAM address of the first static variable
+            of each file.
+
+    Raises:
+        ValueError: if the static variables do not fit in the RAM
+            addresses of the static segment.
+    """
+    static_bases = {}
+    next_address = CodeWriter.STATIC_SEGMENT_START
+    for input_path in input_paths:
+        with open(input_path, 'r') as input_file:
+            static_count = Parser.get_static_count(input_file)
+        static_bases[input_path] = next_address
+        next_address += static_count
+
+    if next_address > CodeWriter.STATIC_SEGMENT_END:
+        raise ValueError(
+            f"Main: The program has {next_address - CodeWriter.STATIC_SEGMENT_START} "
+            f"static variables, only "
+            f"{CodeWriter.STATIC_SEGMENT_END - CodeWriter.STATIC_SEGMENT_START} "
+            f"fit in RAM[{CodeWriter.STATIC_SEGMENT_START}-"
+            f"{CodeWriter.STATIC_SEGMENT_END - 1}]")
+    return static_bases
+
+def find_used_comparisons(
+        input_paths: typing.List[str]) -> typing.Set[str]:
+    """Scans all the files of a program for the (in)equalities it uses, so
+    only their shared routines are placed.
+
+    Args:
+        input_paths (typing.List[str]): the .vm files of the program.
+
+    Returns:
+        typing.Set[str]: the VM commands of the used (in)equalities.
+    """
+    used_comparisons = set()
+    for input_path in input_paths:
+        with open(input_path, 'r') as input_file:
+            used_comparisons |= Parser.get_used_comparisons(input_file)
+    return used_comparisons
+
+def main(in_path, shared_calls=False, shared_comparisons=False,
+         cache_stack_top=False, fuse_commands=False, fusion_stats=False,
+         fold_constants=False, fast_local_init=False,
+         numeric_statics=False, cache_dir=None,
+         cache_size=TranslationCache.DEFAULT_MAX_SIZE, jobs=1):
     # Parses the input path and calls translate_file on each input file.
     # This opens both the input and the output files!
     # Both are closed automatically when the code finishes running.
@@ -54,17 +249,130 @@ def main(in_path):
         files_to_translate = [argument_path]
         output_path, extension = os.path.splitext(argument_path)
     output_path += ".asm"
+    files_to_translate = [
+        input_path for input_path in files_to_translate
+        if os.path.splitext(input_path)[1].lower() == ".vm"]
+    static_bases = {}
+    if numeric_statics:
+        # Allocating before the output is written, so a program whose
+        # statics overflow leaves no output behind
+        static_bases = allocate_statics(files_to_translate)
+    used_comparisons = None
+    if shared_comparisons:
+        used_comparisons = find_used_comparisons(files_to_translate)
     bootstrap = True
+    cache = None
+    if cache_dir is not None:
+        cache = TranslationCache(cache_dir, cache_size)
     with open(output_path, 'w') as output_file:
-        for input_path in files_to_translate:
-            filename, extension = os.path.splitext(input_path)
-            if extension.lower() != ".vm":
-                continue
-            with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file, bootstrap)
+        if cache is not None:
+            # Each cached fragment must not depend on the file being first,
+            # hence the bootstrap is translated on its own, before them
+            output_file.write("\n".join(CodeWriter(
+                BOOTSTRAP_UNIQUE_ID, shared_calls,
+                shared_comparisons).vm_bootstrap(used_comparisons)) + "\n")
             bootstrap = False
 
+        all_fusion_counts = []
+        if 1 < jobs:
+            # The files are translated concurrently, but their fragments are
+            # written by the order of the files, as if translated one by one
+            translate = functools.partial(
+                translate_path, used_comparisons=used_comparisons,
+                cache_dir=cache_dir, cache_size=cache_size,
+                shared_calls=shared_calls,
+                shared_comparisons=shared_comparisons,
+                cache_stack_top=cache_stack_top, fuse_commands=fuse_commands,
+                fold_constants=fold_constants, fast_local_init=fast_local_init)
+            with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+                for fragment, file_fusion_counts in executor.map(
+                        translate, files_to_translate,
+                        [bootstrap] + [False] * (len(files_to_translate) - 1),
+                        [static_bases.get(input_path)
+                         for input_path in files_to_translate]):
+                    output_file.write(fragment)
+                    all_fusion_counts.append(file_fusion_counts)
+        else:
+            for input_path in files_to_translate:
+                if cache is not None:
+                    file_fusion_counts = translate_cached(
+                        input_path, output_file, cache,
+                        shared_calls=shared_calls,
+                        shared_comparisons=shared_comparisons,
+                        cache_stack_top=cache_stack_top,
+                        fuse_commands=fuse_commands,
+                        fold_constants=fold_constants,
+                        fast_local_init=fast_local_init,
+                        static_base=static_bases.get(input_path))
+                else:
+                    with open(input_path, 'r') as input_file:
+                        file_fusion_counts = translate_file(
+                            input_file, output_file, bootstrap, shared_calls,
+                            shared_comparisons, cache_stack_top, fuse_commands,
+                            fold_constants, fast_local_init,
+                            static_bases.get(input_path), used_comparisons)
+                bootstrap = False
+                all_fusion_counts.append(file_fusion_counts)
+
+    if cache is not None:
+        # The cache is bounded once, after all the files were stored in it
+        cache.evict()
+
+    fusion_counts = {name: 0 for name, _ in Parser.FUSION_PATTERNS}
+    cached_count = 0
+    for file_fusion_counts in all_fusion_counts:
+        if file_fusion_counts is None:
+            cached_count += 1
+            continue
+        for name, count in file_fusion_counts.items():
+            fusion_counts[name] += count
+    if fusion_stats:
+        for name, count in fusion_counts.items():
+            print(f"{name}: {count}", file=sys.stderr)
+        if cached_count:
+            print(f"(not counting {cached_count} files served from the "
+                  f"translation cache)", file=sys.stderr)
+
 if "__main__" == __name__:
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    main(sys.argv[1])
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(prog="VMtranslator")
+    arg_parser.add_argument("input_path",
+                            help="a .vm file or a directory to translate")
+    arg_parser.add_argument("--shared-calls", action="store_true",
+                            help="jump to a single call routine and a single "
+                                 "return routine instead of inlining them")
+    arg_parser.add_argument("--shared-comparisons", action="store_true",
+                            help="jump to a single routine per (in)equality "
+                                 "instead of inlining it")
+    arg_parser.add_argument("--cache-stack-top", action="store_true",
+                            help="keep the top of the stack in the D "
+                                 "register across consecutive commands")
+    arg_parser.add_argument("--fuse-commands", action="store_true",
+                            help="translate common sequences of commands "
+                                 "at once")
+    arg_parser.add_argument("--fusion-stats", action="store_true",
+                            help="print the amount of times each sequence "
+                                 "of commands was fused")
+    arg_parser.add_argument("--fold-constants", action="store_true",
+                            help="fold constant computations and conditions "
+                                 "before translating")
+    arg_parser.add_argument("--fast-local-init", action="store_true",
+                            help="initialize locals by the cheapest code for "
+                                 "their amount, and skip it when each local "
+                                 "is written before it is read")
+    arg_parser.add_argument("--numeric-statics", action="store_true",
+                            help="allocate the static variables of all "
+                                 "files to RAM addresses while translating")
+    arg_parser.add_argument("--cache-dir",
+                            help="serve the translation of unchanged files "
+                                 "from a cache at this directory")
+    arg_parser.add_argument("--cache-size", type=int,
+                            default=TranslationCache.DEFAULT_MAX_SIZE // (1024 * 1024),
+                            help="maximal size of the translation cache, "
+                                 "in MiB")
+    arg_parser.add_argument("--jobs", type=int, default=1,
+                            help="amount of files to translate concurrently")
+    args = arg_parser.parse_args()
+    main(args.input_path, args.shared_calls, args.shared_comparisons,
+         args.cache_stack_top, args.fuse_commands, args.fusion_stats,
+         args.fold_constants, args.fast_local_init, args.numeric_statics,
+         args.cache_dir, args.cache_size * 1024 * 1024, args.jobs)
\ No newline at end of file
@@ -8,7 +8,9 @@ Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
 import os
 import re
 from CodeWriter import CodeWriter
-from typing import Optional, TextIO
+from ConstantFolder import ConstantFolder
+from StackCachingCodeWriter import StackCachingCodeWriter
+from typing import Collection, Dict, Iterator, List, Optional, Set, TextIO, Tuple
 
 class Parser:
     """
@@ -50,19 +52,74 @@ class Parser:
 
     COMMENT_NOTATION = "//"
 
-    def __init__(self, input_file: TextIO) -> None:
+    # Sequences of commands which are translated at once (superinstructions)
+    # when fusing commands, as (name, pattern). Each command of a pattern is
+    # matched token by token, where a {placeholder} token matches any token,
+    # but has to match the same token wherever it repeats in the pattern.
+    # Patterns are tried in order, so longer patterns come first
+    FUSION_PATTERNS = [
+        ("increment", [("push", "{segment}", "{address}"),
+                       ("push", "constant", "{amount}"),
+                       ("add",),
+                       ("pop", "{segment}", "{address}")]),
+        ("decrement", [("push", "{segment}", "{address}"),
+                       ("push", "constant", "{amount}"),
+                       ("sub",),
+                       ("pop", "{segment}", "{address}")]),
+        ("push dereference", [("push", "{segment}", "{address}"),
+                              ("pop", "pointer", "1"),
+                              ("push", "that", "0")]),
+        ("dereference", [("pop", "pointer", "1"),
+                         ("push", "that", "0")]),
+        ("add constant", [("push", "constant", "{amount}"),
+                          ("add",)]),
+        ("sub constant", [("push", "constant", "{amount}"),
+                          ("sub",)]),
+    ]
+
+    def __init__(self, input_file: TextIO, shared_calls: bool = False,
+                 shared_comparisons: bool = False,
+                 cache_stack_top: bool = False,
+                 fuse_commands: bool = False,
+                 fold_constants: bool = False,
+                 fast_local_init: bool = False,
+                 static_base: Optional[int] = None) -> None:
         """Gets ready to parse the input file.
 
         Args:
             input_file (typing.TextIO): input file.
+            shared_calls (bool): if this is True, calls and returns jump to
+                routines shared by the whole program, see CodeWriter.
+            shared_comparisons (bool): if this is True, (in)equalities jump
+                to a routine shared by the whole program, see CodeWriter.
+            cache_stack_top (bool): if this is True, the code is translated
+                by a StackCachingCodeWriter, which keeps the top of the
+                stack in D.
+            fuse_commands (bool): if this is True, the sequences of commands
+                in FUSION_PATTERNS are translated at once.
+            fold_constants (bool): if this is True, constant computations
+                are folded before translating, see ConstantFolder.
+            fast_local_init (bool): if this is True, locals are initialized
+                by the cheapest code for their amount, and not at all in
+                functions which write each local before reading it.
+            static_base (Optional[int]): if given, the static variables of
+                this file are placed at this RAM address onwards (see
+                get_static_count).
         """
         self._code = Parser._strip_all_comments(input_file.read()).splitlines()
         self._current_command_index = 0
         # Creating the code writer for this file, the unique ID
         # for labels of the corresponding ASM would be the name
         # of the VM file
-        self._codewriter = CodeWriter(
-            os.path.splitext(os.path.basename(input_file.name))[0])
+        code_writer_class = CodeWriter
+        if cache_stack_top:
+            code_writer_class = StackCachingCodeWriter
+        self._codewriter = code_writer_class(
+            os.path.splitext(os.path.basename(input_file.name))[0],
+            shared_calls, shared_comparisons, fast_local_init, static_base)
+        self._fast_local_init = fast_local_init
+        # The functions whose locals need no initialization
+        self._locals_written_first = set()
         self._command_handlers = {
             # Arithmetic Commands
             "add": self._codewriter.vm_add,
@@ -84,34 +141,229 @@ class Parser:
             "goto": self._codewriter.vm_goto,
             "if-goto": self._codewriter.vm_if_goto,
             # Function Commands
-            "function": lambda name, var_count: self._codewriter.vm_function(name, int(var_count)),
+            "function": lambda name, var_count: self._codewriter.vm_function(
+                name, int(var_count), name not in self._locals_written_first),
             "call": lambda name, var_count: self._codewriter.vm_call(name, int(var_count)),
             "return": self._codewriter.vm_return
         }
+        self._constant_folder = ConstantFolder() if fold_constants else None
+        self._fuse_commands = fuse_commands
+        self._fusion_handlers = {
+            "increment": lambda segment, address, amount: self._codewriter.vm_fused_increment(
+                segment, int(address), "add", int(amount)),
+            "decrement": lambda segment, address, amount: self._codewriter.vm_fused_increment(
+                segment, int(address), "sub", int(amount)),
+            "push dereference": lambda segment, address: self._codewriter.vm_fused_push_dereference(
+                segment, int(address)),
+            "dereference": self._codewriter.vm_fused_dereference,
+            "add constant": lambda amount: self._codewriter.vm_fused_add_constant(int(amount)),
+            "sub constant": lambda amount: self._codewriter.vm_fused_sub_constant(int(amount))
+        }
+        # Counting the amount of times each pattern was fused
+        self._fusion_counts = {name: 0 for name, _ in Parser.FUSION_PATTERNS}
+
+    def iterate_translation(self) -> Iterator[str]:
+        """Translates the file, streaming the ASM code command by command,
+        so the code of the whole file is never held in memory.
 
-    def parse_translate(self):
+        Yields:
+            str: the lines of the ASM code.
         """
+        # Empty commands are skipped
+        commands = (command_tokens for command_tokens in
+                    (command.split() for command in self._code)
+                    if command_tokens)
+        if self._constant_folder is None and not self._fast_local_init and \
+                not self._fuse_commands:
+            # Each command is translated on its own, so the commands are
+            # split only as they are translated
+            for command_tokens in commands:
+                yield from self._translate_command(command_tokens)
+            # The code of the next file must find the whole stack in memory
+            yield from self._codewriter.flush_stack_top()
+            return
+
+        # The rest of the passes look at more than a single command
+        commands = list(commands)
+        if self._constant_folder is not None:
+            commands = self._constant_folder.fold(commands)
+        if self._fast_local_init:
+            self._locals_written_first = Parser._find_locals_written_first(commands)
+        command_index = 0
+        while command_index < len(commands):
+            if self._fuse_commands:
+                fused_count, asm_code = self._translate_fused(commands,
+                                                              command_index)
+                if fused_count:
+                    command_index += fused_count
+                    yield from asm_code
+                    continue
+
+            yield from self._translate_command(commands[command_index])
+            command_index += 1
+        yield from self._codewriter.flush_stack_top()
+
+    def _translate_command(self, command_tokens: List[str]) -> List[str]:
         """
-        asm = []
-        for command in self._code:
-            command_tokens = command.split()
+        Translates a single command
+        """
+        # The first element of the command tokens is the VM command,
+        # hence we get the proper handler for it, and call it, with the
+        # rest of the command tokens, if available
+        return self._command_handlers[command_tokens[0]](*command_tokens[1:])
 
-            # This command is empty, so we skip it
-            if 0 == len(command_tokens):
+    def get_fusion_counts(self) -> Dict[str, int]:
+        """
+        Returns the amount of times each pattern of FUSION_PATTERNS was fused
+        """
+        return dict(self._fusion_counts)
+
+    def _translate_fused(self, commands: List[List[str]],
+                         command_index: int) -> Tuple[int, List[str]]:
+        """
+        Translates the first pattern which matches the commands at the given
+        index, returning the amount of fused commands (0 if none matched)
+        and their ASM code
+        """
+        for name, pattern in Parser.FUSION_PATTERNS:
+            placeholders = Parser._match_pattern(
+                pattern, commands[command_index:command_index + len(pattern)])
+            if placeholders is None:
+                continue
+            asm_code = self._fusion_handlers[name](**placeholders)
+            if asm_code is None:
                 continue
+            self._fusion_counts[name] += 1
+            return len(pattern), asm_code
+        return 0, []
 
-            # The first element of the command tokens is the VM command,
-            # hence we get the proper handler for it, and call it, with the
-            # rest of the command tokens, if available
-            asm += self._command_handlers[command_tokens[0]](*command_tokens[1:])
-        
-        return "\n".join(asm)
-    
-    def get_bootstrap_code(self) -> str:
+    @staticmethod
+    def _match_pattern(pattern: List[tuple],
+                       commands: List[List[str]]) -> Optional[Dict[str, str]]:
+        """
+        Matches the commands against a fusion pattern, returning the tokens
+        matched by each placeholder, None if they do not match
+        """
+        if len(pattern) != len(commands):
+            return None
+        placeholders = {}
+        for pattern_tokens, command_tokens in zip(pattern, commands):
+            if len(pattern_tokens) != len(command_tokens):
+                return None
+            for pattern_token, token in zip(pattern_tokens, command_tokens):
+                if not pattern_token.startswith("{"):
+                    if pattern_token != token:
+                        return None
+                    continue
+                placeholder = pattern_token[1:-1]
+                if placeholders.setdefault(placeholder, token) != token:
+                    return None
+        return placeholders
+
+    @staticmethod
+    def get_static_count(input_file: TextIO) -> int:
+        """Scans a file for the amount of static variables it needs.
+
+        Args:
+            input_file (typing.TextIO): input file.
+
+        Returns:
+            int: one past the largest index of the static segment used by
+                the file.
+        """
+        code = Parser._strip_all_comments(input_file.read())
+        indices = [int(index) for index in re.findall(
+            r"\b(?:push|pop)\s+static\s+(\d+)", code)]
+        return max(indices) + 1 if indices else 0
+
+    @staticmethod
+    def get_used_comparisons(input_file: TextIO) -> Set[str]:
+        """Scans a file for the (in)equalities it uses.
+
+        Args:
+            input_file (typing.TextIO): input file.
+
+        Returns:
+            Set[str]: the VM commands of the (in)equalities used by the
+                file, out of eq, gt & lt.
+        """
+        code = Parser._strip_all_comments(input_file.read())
+        return set(re.findall(r"^\s*(eq|gt|lt)\s*$", code, re.MULTILINE))
+
+    @staticmethod
+    def _find_locals_written_first(commands: List[List[str]]) -> set:
+        """
+        Returns the names of the functions which write each of their locals
+        before reading it, on every path through the function
+        """
+        functions = set()
+        function_indices = [index for index, command in enumerate(commands)
+                            if "function" == command[0]]
+        for start, end in zip(function_indices,
+                              function_indices[1:] + [len(commands)]):
+            name, local_var_count = commands[start][1], int(commands[start][2])
+            if 0 < local_var_count and Parser._are_locals_written_first(
+                    commands[start + 1:end], local_var_count):
+                functions.add(name)
+        return functions
+
+    @staticmethod
+    def _are_locals_written_first(body: List[List[str]],
+                                  local_var_count: int) -> bool:
+        """
+        Checks whether no path through the body of a function reads a local
+        before writing it, by propagating the set of locals which may still
+        be unwritten at each command, until nothing changes
+        """
+        labels = {}
+        for index, command in enumerate(body):
+            if "label" == command[0]:
+                if command[1] in labels:
+                    return False
+                labels[command[1]] = index
+
+        unwritten_at = {0: frozenset(range(local_var_count))}
+        pending_indices = [0]
+        while pending_indices:
+            index = pending_indices.pop()
+            if index >= len(body):
+                continue
+            unwritten = unwritten_at[index]
+            command = body[index]
+            if command[0] in ["push", "pop"] and "local" == command[1]:
+                local_index = int(command[2])
+                if "push" == command[0] and local_index in unwritten:
+                    return False
+                if "pop" == command[0]:
+                    unwritten = unwritten - {local_index}
+
+            if command[0] in ["goto", "if-goto"]:
+                if command[1] not in labels:
+                    # Jumping out of the function, nothing is known there
+                    return False
+                successors = [labels[command[1]]]
+                if "if-goto" == command[0]:
+                    successors.append(index + 1)
+            elif "return" == command[0]:
+                successors = []
+            else:
+                successors = [index + 1]
+
+            for successor in successors:
+                previous = unwritten_at.get(successor)
+                merged = unwritten if previous is None else previous | unwritten
+                if merged != previous:
+                    unwritten_at[successor] = merged
+                    pending_indices.append(successor)
+        return True
+
+    def get_bootstrap_code(
+            self, used_comparisons: Optional[Collection[str]] = None) -> str:
         """
-        Generating the generic bootstrap code
+        Generating the generic bootstrap code, only placing the shared
+        routines of the given (in)equalities (all of them if None)
         """
-        return "\n".join(self._codewriter.vm_bootstrap())
+        return "\n".join(self._codewriter.vm_bootstrap(used_comparisons))
 
     @staticmethod
     def _strip_all_comments(code):
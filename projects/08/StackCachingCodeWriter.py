@@ -0,0 +1,277 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+from typing import List, Optional
+from CodeWriter import CodeWriter, GENERIC_PUSH_D_REGISTER_ASM
+
+class StackCachingCodeWriter(CodeWriter):
+    """Translates VM commands into Hack assembly code, while caching the
+    topmost value of the stack in the D register.
+    While the top is cached, it is not stored in the stack (SP points right
+    past the value below it), so a push followed by a command which pops
+    the value skips both the store and the reload.
+    The top is stored back (flushed) before every command which needs the
+    whole stack in memory, and before control may reach or leave the
+    current basic block (labels, jumps, calls & returns).
+    """
+
+    # Binary arithmetic commands, computing the result into D, given y in D
+    # and x in M
+    BINARY_COMPS = {
+        "add": "D+M",
+        "sub": "M-D",
+        "and": "D&M",
+        "or": "D|M"
+    }
+
+    # Unary arithmetic commands, computing the result into D from D
+    UNARY_COMPS = {
+        "neg": "-D",
+        "not": "!D",
+        "shiftleft": "D<<",
+        "shiftright": "D>>"
+    }
+
+    def __init__(self, unique_id: str, shared_calls: bool = False,
+                 shared_comparisons: bool = False,
+                 fast_local_init: bool = False,
+                 static_base: Optional[int] = None) -> None:
+        """
+        Initializes the StackCachingCodeWriter, see CodeWriter
+        """
+        super().__init__(unique_id, shared_calls, shared_comparisons,
+                         fast_local_init, static_base)
+        # Is the topmost value of the stack in D (rather than in memory)?
+        self._top_in_d = False
+
+    def flush_stack_top(self) -> List[str]:
+        """
+        Generating the Hack ASM code which stores the cached top of the
+        stack, if there is any
+        """
+        if not self._top_in_d:
+            return []
+        self._top_in_d = False
+        return list(GENERIC_PUSH_D_REGISTER_ASM)
+
+    #######################
+    # Arithmetic commands #
+    #######################
+
+    def vm_add(self) -> List[str]:
+        return self._generate_binary("add")
+
+    def vm_sub(self) -> List[str]:
+        return self._generate_binary("sub")
+
+    def vm_and(self) -> List[str]:
+        return self._generate_binary("and")
+
+    def vm_or(self) -> List[str]:
+        return self._generate_binary("or")
+
+    def vm_neg(self) -> List[str]:
+        return self._generate_unary("neg") or super().vm_neg()
+
+    def vm_not(self) -> List[str]:
+        return self._generate_unary("not") or super().vm_not()
+
+    def vm_shiftleft(self) -> List[str]:
+        return self._generate_unary("shiftleft") or super().vm_shiftleft()
+
+    def vm_shiftright(self) -> List[str]:
+        return self._generate_unary("shiftright") or super().vm_shiftright()
+
+    def vm_eq(self) -> List[str]:
+        return self.flush_stack_top() + super().vm_eq()
+
+    def vm_gt(self) -> List[str]:
+        return self.flush_stack_top() + super().vm_gt()
+
+    def vm_lt(self) -> List[str]:
+        return self.flush_stack_top() + super().vm_lt()
+
+    ###############################
+    # Stack-manipulating commands #
+    ###############################
+
+    def vm_push(self, segment: str, address: int) -> List[str]:
+        """
+        Loading the value into D, which becomes the cached top of the stack
+        (the previous top is flushed)
+        """
+        asm_code = [f"// push {segment} {address}"] + self.flush_stack_top()
+        if segment == CodeWriter.CONSTANT_SEGMENT_NOTATION:
+            # Both 0 & 1 can be computed by the ALU directly
+            if address in [0, 1]:
+                asm_code += [f"D={address}"]
+            else:
+                asm_code += [f"@{address}", "D=A"]
+        else:
+            asm_code += self._generate_segment_address(segment, address) + ["D=M"]
+        self._top_in_d = True
+        return asm_code
+
+    def vm_pop(self, segment: str, address: int) -> List[str]:
+        """
+        Storing the top of the stack (loaded into D if it is not cached)
+        """
+        asm_code = [f"// pop {segment} {address}"] + self._load_stack_top()
+        self._top_in_d = False
+
+        # Static & fixed segments, and small offsets, are addressed keeping D
+        variable_address = self._generate_walked_address(segment, address)
+        if variable_address is not None:
+            return asm_code + variable_address + ["M=D"]
+
+        segment_pointer = CodeWriter.DYNAMIC_SEGMENTS_MAPPING[segment]
+        return asm_code + [
+            "@R13",
+            "M=D", # Saving the value, as D is needed for the address
+            f"@{address}",
+            "D=A",
+            f"@{segment_pointer}",
+            "D=D+M",
+            "@R14",
+            "M=D",
+            "@R13",
+            "D=M",
+            "@R14",
+            "A=M",
+            "M=D"
+        ]
+
+    ######################
+    # Branching Commands #
+    ######################
+
+    def vm_label(self, name: str) -> List[str]:
+        return self.flush_stack_top() + super().vm_label(name)
+
+    def vm_goto(self, label_name: str) -> List[str]:
+        return self.flush_stack_top() + super().vm_goto(label_name)
+
+    def vm_if_goto(self, label_name: str) -> List[str]:
+        """
+        Jumping upon the top of the stack (which is popped) being nonzero,
+        the rest of the stack is in memory on both paths
+        """
+        asm_code = [f"// if-goto {label_name}"] + self._load_stack_top()
+        self._top_in_d = False
+        return asm_code + [
+            f"@{label_name}_{self._uid}",
+            "D;JNE"
+        ]
+
+    #####################
+    # Function Commands #
+    #####################
+
+    def vm_function(self, name: str, local_var_count: int,
+                    zero_locals: bool = True) -> List[str]:
+        return self.flush_stack_top() + \
+               super().vm_function(name, local_var_count, zero_locals)
+
+    def vm_call(self, func_name: str, argument_count: int) -> List[str]:
+        return self.flush_stack_top() + super().vm_call(func_name, argument_count)
+
+    def vm_return(self) -> List[str]:
+        return self.flush_stack_top() + super().vm_return()
+
+    ##################
+    # Fused Commands #
+    ##################
+
+    def vm_fused_add_constant(self, amount: int) -> List[str]:
+        return [f"// push constant {amount}; add"] + self._load_stack_top() + \
+               self._cache_stack_top([f"@{amount}", "D=D+A"])
+
+    def vm_fused_sub_constant(self, amount: int) -> List[str]:
+        return [f"// push constant {amount}; sub"] + self._load_stack_top() + \
+               self._cache_stack_top([f"@{amount}", "D=D-A"])
+
+    def vm_fused_increment(self, segment: str, address: int, command: str,
+                           amount: int) -> List[str]:
+        """
+        Updating the variable in place, while the stack is not involved
+        (and D is needed, so the top is flushed)
+        """
+        asm_code = super().vm_fused_increment(segment, address, command, amount)
+        if asm_code is None:
+            return None
+        return self.flush_stack_top() + asm_code
+
+    def vm_fused_dereference(self) -> List[str]:
+        """
+        The value pointed to replaces the address in D
+        """
+        return ["// pop pointer 1; push that 0"] + self._load_stack_top() + \
+               self._cache_stack_top(CodeWriter._generate_that_dereference())
+
+    def vm_fused_push_dereference(self, segment: str,
+                                  address: int) -> List[str]:
+        """
+        The value pointed to is loaded into D (the previous top is flushed)
+        """
+        asm_code = [f"// push {segment} {address}; pop pointer 1; push that 0"] + \
+                   self.flush_stack_top()
+        if segment == CodeWriter.CONSTANT_SEGMENT_NOTATION:
+            asm_code += [f"@{address}", "D=A"]
+        else:
+            asm_code += self._generate_segment_address(segment, address) + ["D=M"]
+        return asm_code + \
+               self._cache_stack_top(CodeWriter._generate_that_dereference())
+
+    #####################
+    # Utility functions #
+    #####################
+
+    def _cache_stack_top(self, asm_code: List[str]) -> List[str]:
+        """
+        Marks the top of the stack as cached in D, once the given code
+        (which computes it) runs
+        """
+        self._top_in_d = True
+        return asm_code
+
+    def _load_stack_top(self) -> List[str]:
+        """
+        Generates the Hack ASM code which pops the top of the stack into D,
+        unless it is already cached there
+        """
+        if self._top_in_d:
+            return []
+        return [
+            "@SP",
+            "AM=M-1",
+            "D=M"
+        ]
+
+    def _generate_binary(self, command: str) -> List[str]:
+        """
+        Generates the Hack ASM code of a binary arithmetic command, whose
+        result is cached in D
+        """
+        asm_code = [f"// {command}"] + self._load_stack_top() + [
+            "@SP",
+            "AM=M-1", # Popping x, as the result is kept in D
+            f"D={StackCachingCodeWriter.BINARY_COMPS[command]}"
+        ]
+        self._top_in_d = True
+        return asm_code
+
+    def _generate_unary(self, command: str) -> List[str]:
+        """
+        Generates the Hack ASM code of a unary arithmetic command on the
+        cached top, an empty list if the top is not cached
+        """
+        if not self._top_in_d:
+            return []
+        return [
+            f"// {command}",
+            f"D={StackCachingCodeWriter.UNARY_COMPS[command]}"
+        ]
@@ -0,0 +1,51 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+from typing import Optional
+from ContentCache import ContentCache
+
+class TranslationCache(ContentCache):
+    """A cache of the ASM fragments of translated .vm files, keyed by a hash
+    of the VM code, the name of the file (which its labels are made of),
+    the translation options and the translator itself, see ContentCache.
+    """
+
+    ENTRY_EXTENSION = ".asm"
+    SOURCE_MODULES = ("Main.py", "Parser.py", "CodeWriter.py",
+                      "StackCachingCodeWriter.py", "ConstantFolder.py")
+
+    def fetch(self, key: str) -> Optional[str]:
+        """Returns the cached fragment of the given key.
+
+        Args:
+            key (str): the cache key, see 'key'.
+
+        Returns:
+            Optional[str]: the ASM fragment, None if the key is not cached.
+        """
+        entry_path = self._use_entry(key)
+        if entry_path is None:
+            return None
+        try:
+            with open(entry_path, 'r') as entry_file:
+                return entry_file.read()
+        except FileNotFoundError:
+            # Evicted by a concurrent build
+            return None
+
+    def store(self, key: str, fragment: str) -> None:
+        """Caches the given fragment under the given key (the cache is only
+        bounded by 'evict').
+
+        Args:
+            key (str): the cache key, see 'key'.
+            fragment (str): the ASM fragment to cache.
+        """
+        def write_entry(entry_path: str) -> None:
+            with open(entry_path, 'w') as entry_file:
+                entry_file.write(fragment)
+        self._add_entry(key, write_entry)
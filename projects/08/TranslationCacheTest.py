@@ -0,0 +1,71 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import io
+import os
+import tempfile
+import unittest
+
+import Main
+from TranslationCache import TranslationCache
+
+class TranslationCacheTest(unittest.TestCase):
+    """Tests the translation of files through the TranslationCache."""
+
+    def setUp(self) -> None:
+        """Creates a VM file and a cache in a temporary directory."""
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self._cache = TranslationCache(
+            os.path.join(self._temp_dir.name, "cache"))
+        self._input_path = os.path.join(self._temp_dir.name, "Prog.vm")
+        with open(self._input_path, 'w') as input_file:
+            input_file.write("function Prog.main 0\n"
+                             "push constant 7\n"
+                             "push constant 8\n"
+                             "lt\n"
+                             "return\n")
+
+    def tearDown(self) -> None:
+        """Removes the temporary directory."""
+        self._temp_dir.cleanup()
+
+    def _translate(self, **options):
+        """
+        Translates the file through the cache, returns the fragment and the
+        result of 'translate_cached'
+        """
+        output_file = io.StringIO()
+        result = Main.translate_cached(self._input_path, output_file,
+                                       self._cache, **options)
+        return output_file.getvalue(), result
+
+    def test_cold_and_warm(self) -> None:
+        """A file is translated once, then served from the cache."""
+        cold_fragment, cold_result = self._translate()
+        self.assertIsNotNone(cold_result)
+        warm_fragment, warm_result = self._translate()
+        self.assertIsNone(warm_result)
+        self.assertEqual(warm_fragment, cold_fragment)
+
+    def test_options_are_keyed(self) -> None:
+        """Translating with other options is not served from the cache."""
+        self._translate()
+        fragment, result = self._translate(shared_comparisons=True)
+        self.assertIsNotNone(result)
+        self.assertIn("__VM_LT", fragment)
+
+    def test_only_translator_modules_are_versioned(self) -> None:
+        """The test scripts next to the translator do not affect its
+        version.
+        """
+        self.assertNotIn("TranslateTestFiles.py",
+                         TranslationCache.SOURCE_MODULES)
+        self.assertNotIn("TranslationCacheTest.py",
+                         TranslationCache.SOURCE_MODULES)
+
+if "__main__" == __name__:
+    unittest.main()